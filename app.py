@@ -1,152 +1,543 @@
-from dash import Dash, dcc, html, Input, Output, Patch, State, ctx, no_update, ALL
+import importlib.util
+import threading
+from itertools import permutations
+from dash import Dash, dcc, html, Input, Output, Patch, State, ctx, no_update, ALL, ClientsideFunction,\
+                 callback, clientside_callback, DiskcacheManager
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
+import os
 from components import comparison_mode
 from components.input_table import make_input_table
 from utils.utils import get_df
-from utils.presets import DEFAULT_MODES, DEFAULT_AGGREGATION, DAYTYPE_COLORS,\
-                          DEFAULT_RESOLUTION, MAIN_FIGURE_LAYOUT
-
-app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
-ridership_df = (
-    pd.read_csv(
-        "data/cta-ridership-clean.csv",
-        parse_dates=['date']
+from utils.store import RidershipStore, DatasetHandle
+from utils.ingest import DatasetWatcher
+from utils.metrics import CallbackMetrics
+from utils.api import RidershipAPI
+from utils import comparison
+from utils.session import SessionStore
+from utils.encoding import typed_array
+from utils.downsample import downsample, downsample_figure
+from utils.figures import daytype_figure, figure_layout, frame_figure, line_trace
+from utils.presets import DEFAULT_MODES, DEFAULT_AGGREGATION, DEFAULT_RESOLUTION, DOWNSAMPLING,\
+                          ALL_MODES, SESSION_STORE, BACKGROUND_CALLBACKS, OVERLAYS, RESOLUTION_OPTIONS,\
+                          RESOLUTION_NAMES, AGGREGATION_OPTIONS, WARM_CACHE, ZOOMED_REFINEMENT
+
+CLEAN_CSV = "data/cta-ridership-clean.csv"
+# part of the figure cache's version next to the dataset checksum; goes up
+# whenever any cached view (figures, traces, day type and comparison views)
+# is built differently, so what an older release left on disk is not served
+FIGURE_FORMAT = 4
+dataset = None
+sessions = None
+
+# the overlay traces of the zoomed chart, after its one trace per mode
+OVERLAY_TRACES = [(overlay, mode) for overlay in OVERLAYS for mode in ALL_MODES]
+
+
+# background callbacks are opt-in and need diskcache; otherwise the
+# expensive callbacks run in the request. Only the presence of diskcache is
+# checked here, the manager and its cache are created with the app.
+BACKGROUND = BACKGROUND_CALLBACKS['enabled'] and importlib.util.find_spec("diskcache") is not None
+
+
+class BackgroundManager(DiskcacheManager):
+    # a finished job can exit while its child processes are being listed,
+    # psutil then raises NoSuchProcess; there is nothing left to terminate
+    def terminate_job(self, job):
+        import psutil
+        try:
+            super().terminate_job(job)
+        except psutil.NoSuchProcess:
+            pass
+
+
+def make_background_manager(cache_dir, expire):
+    if not BACKGROUND:
+        return None
+    import diskcache
+    return BackgroundManager(diskcache.Cache(cache_dir), expire=expire)
+
+
+def background(*running):
+    """Callback options for an expensive callback: with background callbacks
+    enabled it runs as a background job in the app's manager, and a newer
+    trigger terminates the job still computing the stale one. `running` are
+    (Output, value while running, value after) triples for the running
+    state."""
+    options = {'running': list(running)}
+    if BACKGROUND:
+        options.update(background=True, interval=BACKGROUND_CALLBACKS['interval'])
+    return options
+
+
+def load_dataset(csv_path=CLEAN_CSV):
+    global dataset
+    if dataset is None:
+        dataset = DatasetHandle(RidershipStore.from_csv(csv_path))
+        dataset.subscribe(lambda store: comparison_mode.figure_cache.set_version(f"{FIGURE_FORMAT}-{store.version}"))
+    return dataset
+
+
+def load_sessions():
+    # the session directory is only created by the app, not on import
+    global sessions
+    if sessions is None:
+        sessions = SessionStore(**SESSION_STORE)
+    return sessions
+
+
+def start_watcher(csv_path=CLEAN_CSV):
+    # threads do not survive a fork, so under a preloading server every
+    # worker starts its own watcher after it has been forked
+    watcher = DatasetWatcher(dataset, RidershipStore.from_csv, csv_path)
+    watcher.start()
+    return watcher
+
+
+def make_main_figure(ridership_store):
+    fig = frame_figure(
+        get_df(
+            ridership_store,
+            ridership_store.dates[0], ridership_store.dates[-1],
+            DEFAULT_MODES, DEFAULT_RESOLUTION, DEFAULT_AGGREGATION
+        ),
+        DEFAULT_MODES, 'main', mode='lines+markers'
     )
-    .sort_values('date')
-)
+    downsample_figure(fig, DOWNSAMPLING['time-series-chart'])
+    return fig
 
-fig = px.line(
-    data_frame=get_df(
-        ridership_df,
-        ridership_df['date'].min(), ridership_df['date'].max(),
-        DEFAULT_MODES, DEFAULT_RESOLUTION, DEFAULT_AGGREGATION
-    ),
-    x='date',
-    y=DEFAULT_MODES,
-    markers=True
-)
 
-fig.update_layout(**MAIN_FIGURE_LAYOUT)
+def overlay_frames(window, modes, overlays, resolution, aggregation):
+    # {overlay: DataFrame(date, *modes)} of a store window at the chart's
+    # resolution, read from the precomputed rolling means or the cube
+    frames = {}
+    for overlay in overlays:
+        if overlay == 'yoy':
+            frames[overlay] = window.year_over_year(modes, resolution, aggregation)
+        else:
+            frames[overlay] = window.rolling(modes, int(overlay), resolution, aggregation)
+    return frames
+
+
+def make_zoomed_figure():
+    # one trace per mode and one per overlay and mode that stay in place;
+    # the callback only patches their x, y and visibility
+    return go.Figure([
+        line_trace([], [], mode, visible=False)
+        for mode in ALL_MODES
+    ] + [
+        line_trace([], [], f"{mode} {OVERLAYS[overlay]}", visible=False, line={'dash': 'dot'})
+        for overlay, mode in OVERLAY_TRACES
+    ], layout=figure_layout('zoomed'))
+
+
+def get_main_figure(ridership_store):
+    # kept as plain JSON in the version scoped figure cache, so other
+    # workers and restarts on the same dataset load it instead of building it
+    return comparison_mode.figure_cache.get_or_compute(
+        ('main-figure',), lambda: make_main_figure(ridership_store).to_plotly_json()
+    )
 
-input_table = make_input_table()
-comparison_div = comparison_mode.make_comparison_div()
 
-app.layout = dbc.Container([
-    dbc.Col([
-        html.H4('CTA Ridership', className="text-center"),
-        dbc.Row(dcc.Graph(id="time-series-chart", figure=fig))
-    ], align='center', className="mb-0"),
-    dbc.Row([
-        dbc.Col([
-            input_table,
-            dbc.Row([
-                dbc.Col(dcc.Graph(id="daytype-vis"))
-            ], className="d-none", id="daytype-div")], width=6),
+def make_main_trace(ridership_store, mode, resolution, aggregation, overlay=None):
+    window = ridership_store.selection(ridership_store.dates[0], ridership_store.dates[-1])
+    if overlay is None:
+        df, name = window.aggregate([mode], resolution, aggregation), mode
+        props = {}
+    else:
+        df, name = overlay_frames(window, [mode], [overlay], resolution, aggregation)[overlay], f"{mode} {OVERLAYS[overlay]}"
+        props = {'line' : {'dash' : 'dot'}}
+    x, y, dropped = downsample(df['date'], df[mode], DOWNSAMPLING['time-series-chart'], name=name)
+    return {'type' : 'scattergl', 'mode' : 'lines' if overlay else 'lines+markers', 'x' : x, 'y' : y, 'name' : name,
+            **props, 'meta' : {'dropped_points' : dropped}}
+
+
+def make_zoomed_trace(window, mode, resolution, aggregation, overlay=None):
+    if overlay is None:
+        df, name = window.aggregate([mode], resolution, aggregation), mode
+    else:
+        df, name = overlay_frames(window, [mode], [overlay], resolution, aggregation)[overlay], f"{mode} {OVERLAYS[overlay]}"
+    x, y, dropped = downsample(df['date'], df[mode], DOWNSAMPLING['zoomed-time-series-chart'], name=name)
+    return {'x' : typed_array(x), 'y' : typed_array(y), 'meta' : {'dropped_points' : dropped}}
+
+
+# the views live in the version scoped figure cache, one entry per trace so
+# any combination of modes and overlays is a handful of lookups. The main
+# chart's traces are kept once computed; zoomed and day type views only when
+# warm_up computes them for a popular window, an arbitrary selection is
+# rarely asked for twice
+
+def main_trace(ridership_store, mode, resolution, aggregation, overlay=None):
+    return comparison_mode.figure_cache.get_or_compute(
+        ('main-trace', mode, resolution, aggregation, overlay),
+        lambda: make_main_trace(ridership_store, mode, resolution, aggregation, overlay)
+    )
+
+
+def zoomed_trace(window, mode, resolution, aggregation, overlay=None, keep=False):
+    key = ('zoomed-trace', str(window.min_date), str(window.max_date), mode, resolution, aggregation, overlay)
+    trace = comparison_mode.figure_cache.get(key)
+    if trace is None:
+        trace = make_zoomed_trace(window, mode, resolution, aggregation, overlay)
+        if keep:
+            comparison_mode.figure_cache.set(key, trace)
+    return trace
+
+
+def daytype_view(window, modes, resolution, aggregation, keep=False):
+    key = ('daytype', str(window.min_date), str(window.max_date), tuple(modes), resolution, aggregation)
+    view = comparison_mode.figure_cache.get(key)
+    if view is None:
+        view = daytype_figure(window.split_daytypes(modes, resolution, aggregation), modes)
+        if keep:
+            view = view.to_plotly_json()
+            comparison_mode.figure_cache.set(key, view)
+    return view
+
+
+def warm_windows(ridership_store):
+    last = pd.Timestamp(ridership_store.dates[-1])
+    for window in WARM_CACHE['windows']:
+        if isinstance(window, int):
+            window = (last - pd.Timedelta(days=window - 1)).strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')
+        yield ridership_store.selection(*window)
+
+
+def warm_views(ridership_store):
+    """Every view warm_up computes, as calls that look it up or build it."""
+    yield lambda: get_main_figure(ridership_store)
+    overlays = [None, *OVERLAYS]
+    for resolution in RESOLUTION_OPTIONS['main']:
+        for aggregation in AGGREGATION_OPTIONS:
+            for overlay in overlays:
+                for mode in ALL_MODES:
+                    yield lambda r=resolution, a=aggregation, o=overlay, m=mode: \
+                        main_trace(ridership_store, m, r, a, o)
+
+    mode_orders = [list(modes) for n in range(1, len(ALL_MODES) + 1) for modes in permutations(ALL_MODES, n)]
+    for window in warm_windows(ridership_store):
+        for resolution in RESOLUTION_OPTIONS['zoomed']:
+            for aggregation in AGGREGATION_OPTIONS:
+                for overlay in overlays:
+                    for mode in ALL_MODES:
+                        yield lambda w=window, r=resolution, a=aggregation, o=overlay, m=mode: \
+                            zoomed_trace(w, m, r, a, o, keep=True)
+        for resolution in RESOLUTION_OPTIONS['daytype']:
+            for aggregation in AGGREGATION_OPTIONS:
+                for modes in mode_orders:
+                    yield lambda w=window, r=resolution, a=aggregation, m=modes: daytype_view(w, m, r, a, keep=True)
+
+
+def warm_up(ridership_store):
+    """Fills the figure cache with every view of `warm_views`; what an earlier
+    process already left on disk is only looked up. Stops once another store
+    has been swapped in, that one gets its own warm-up."""
+    for view in warm_views(ridership_store):
+        if dataset.current() is not ridership_store:
+            return
+        view()
+
+
+def start_warmup():
+    # like the watcher, started in every worker after the fork; the handle
+    # runs it for the current store now and for every store swapped in
+    dataset.subscribe(
+        lambda store: threading.Thread(target=warm_up, args=(store,), daemon=True, name="view-warmup").start()
+    )
+
+
+def make_layout(main_figure=None, zoomed_figure=None):
+    fig = main_figure
+    input_table = make_input_table()
+    comparison_div = comparison_mode.make_comparison_div()
+
+    return dbc.Container([
         dbc.Col([
-            dbc.Row([
-                dbc.Col(html.Div("Ridership from "), width="auto"),
-                dbc.Col(dcc.DatePickerSingle(id="from-date"), width="auto"),
-                dbc.Col(html.Div(" until "), width="auto"),
-                dbc.Col(dcc.DatePickerSingle(id="till-date"), width="auto"),
-                dbc.Col(dbc.Button(
-                    "save timeframe", id="save-button"
-                ))
-            ], align="center", className="g-2 mt-0"),
-            dcc.Graph(
-                id='zoomed-time-series-chart'
-            )],
-            id="zoomed-div",
-            className="d-none mt-0 mb-0",
-            width=6
+            html.H4('CTA Ridership', className="text-center"),
+            dbc.Row(dcc.Graph(id="time-series-chart", figure=fig))
+        ], align='center', className="mb-0"),
+        dbc.Row([
+            dbc.Col([
+                input_table,
+                dbc.Row([
+                    dbc.Col(dcc.Graph(id="daytype-vis"))
+                ], className="d-none", id="daytype-div")], width=6),
+            dbc.Col([
+                dbc.Row([
+                    dbc.Col(html.Div("Ridership from "), width="auto"),
+                    dbc.Col(dcc.DatePickerSingle(id="from-date"), width="auto"),
+                    dbc.Col(html.Div(" until "), width="auto"),
+                    dbc.Col(dcc.DatePickerSingle(id="till-date"), width="auto"),
+                    dbc.Col(dbc.Button(
+                        "save timeframe", id="save-button"
+                    ))
+                ], align="center", className="g-2 mt-0"),
+                dcc.Graph(
+                    id='zoomed-time-series-chart',
+                    figure=zoomed_figure
+                )],
+                id="zoomed-div",
+                className="d-none mt-0 mb-0",
+                width=6
+            )
+        ], className="mb-0"),
+        dcc.Store(id='session-id'),
+        dcc.Store(id='zoomed-view'),
+        dcc.Store(id='selection-request'),
+        comparison_div
+    ], fluid=True)
+
+
+_layout = {'version': None, 'layout': None}
+
+
+def serve_layout():
+    # built on the first page load, and again only after a dataset swap
+    ridership_store = dataset.current()
+    if _layout['layout'] is None or _layout['version'] != ridership_store.version:
+        _layout.update(
+            version=ridership_store.version,
+            layout=make_layout(get_main_figure(ridership_store), make_zoomed_figure())
         )
-    ], className="mb-0"),
-    dcc.Store(id='dates'),
-    dcc.Store(id='old_check'),
-    comparison_div
-], fluid=True)
+    return _layout['layout']
+
 
-@app.callback(
+def create_app(csv_path=CLEAN_CSV, watch=True, profile_threshold=None, warm=True):
+    load_dataset(csv_path)
+    load_sessions()
+    app = Dash(
+        __name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
+        background_callback_manager=make_background_manager(
+            BACKGROUND_CALLBACKS['cache_dir'], BACKGROUND_CALLBACKS['expire']
+        )
+    )
+    # the callbacks are checked against a layout without figures, the real
+    # one is only built when it is first requested
+    app.validation_layout = make_layout()
+    app.layout = serve_layout
+
+    # CITY_PROFILE_THRESHOLD=0.5 dumps a cProfile of every callback slower
+    # than half a second into profiles/
+    if profile_threshold is None and os.environ.get("CITY_PROFILE_THRESHOLD"):
+        profile_threshold = float(os.environ["CITY_PROFILE_THRESHOLD"])
+    app.metrics = CallbackMetrics(app, profile_threshold=profile_threshold)
+    app.api = RidershipAPI(app, dataset)
+    if watch:
+        start_watcher(csv_path)
+    if warm:
+        start_warmup()
+    return app
+
+
+@callback(
     Output("time-series-chart", "figure"), 
     Input("modes1", "value"),
     Input('resolution1', 'value'),
-    Input('aggregation1', 'value')
+    Input('aggregation1', 'value'),
+    Input('overlay1', 'value')
     )
-def display_time_series(modes, resolution, aggregation):
-    min_date, max_date = "2001-01-01", "2024-12-31"
-    df = get_df(ridership_df, min_date, max_date, modes=modes, resolution=resolution, aggregation_method=aggregation)
+def display_time_series(modes, resolution, aggregation, overlays):
+    ridership_store = dataset.current()
+    fig = Patch()
+    fig['data'] = [
+        main_trace(ridership_store, mode, resolution, aggregation, overlay)
+        for overlay in [None, *(overlays or [])] for mode in modes
+    ]
+    return fig
+
+
+# the inputs each of the selection's charts is drawn from
+ZOOMED_INPUTS = {"selection-request.data", "from-date.date", "till-date.date",
+                 "modes2.value", "resolution2.value", "aggregation2.value", "overlay2.value"}
+DAYTYPE_INPUTS = {"selection-request.data", "from-date.date", "till-date.date",
+                  "modes2.value", "resolution3.value", "aggregation3.value"}
+
+
+def latest_request(session_id, seq):
+    """Records `seq` as the newest selection request of the session; False
+    when a newer one already got to the server, this one is stale."""
+    if session_id is None:
+        return True
+    try:
+        with sessions.edit(session_id) as session:
+            if seq < session.get('selection_seq', 0):
+                return False
+            session['selection_seq'] = seq
+    except ValueError:
+        return True
+    return True
+
+
+def zoomed_patch(window, modes, resolution, aggregation, overlays, x_range=None, slider_range=None):
+    """Patch of the zoomed chart's traces over `window`, its x axis titled
+    with the resolution shown. Without `x_range` both the chart and its
+    range slider autorange to the data."""
     fig = Patch()
-    fig['data'] = [{'x' : df['date'], 'y' : df[mode], 'name' : mode} for mode in modes]
+    traces = [(None, mode) for mode in ALL_MODES] + OVERLAY_TRACES
+    for i, (overlay, mode) in enumerate(traces):
+        if mode not in modes or (overlay is not None and overlay not in (overlays or [])):
+            fig['data'][i]['visible'] = False
+            continue
+        trace = zoomed_trace(window, mode, resolution, aggregation, overlay)
+        fig['data'][i]['x'] = trace['x']
+        fig['data'][i]['y'] = trace['y']
+        fig['data'][i]['visible'] = True
+        fig['data'][i]['meta'] = trace['meta']
+
+    fig['layout']['xaxis']['title'] = {'text': f"Date ({aggregation} per {RESOLUTION_NAMES[resolution]})"}
+    if x_range is None:
+        fig['layout']['xaxis']['autorange'] = True
+        fig['layout']['xaxis']['rangeslider']['autorange'] = True
+    else:
+        fig['layout']['xaxis']['range'] = x_range
+        fig['layout']['xaxis']['autorange'] = False
+        fig['layout']['xaxis']['rangeslider']['range'] = slider_range
+        fig['layout']['xaxis']['rangeslider']['autorange'] = False
     return fig
 
-@app.callback(
+
+def zoomed_range(relayoutData):
+    """The x range of the zoomed chart after a relayout: [from, till] after a
+    zoom, a pan or a drag of the range slider, 'auto' after a reset, None
+    when the x axis did not move."""
+    if not relayoutData:
+        return None
+    if relayoutData.get('xaxis.autorange'):
+        return 'auto'
+    if 'xaxis.range' in relayoutData:
+        return list(relayoutData['xaxis.range'])
+    if 'xaxis.range[0]' in relayoutData and 'xaxis.range[1]' in relayoutData:
+        return [relayoutData['xaxis.range[0]'], relayoutData['xaxis.range[1]']]
+    return None
+
+
+def refined_patch(window, x_range, modes, resolution, aggregation, overlays, view):
+    """Patch of the zoomed chart showing `x_range` with the data of the range
+    and a margin around it; means at the finest level of ZOOMED_REFINEMENT
+    that fits its point budget, sums at `resolution`, as a sum per period
+    changes scale with the period. Also returns the loaded level and range;
+    a range still inside the loaded one at the same level sends nothing."""
+    start, end = pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1])
+    margin = (end - start) * ZOOMED_REFINEMENT['margin']
+    loaded = window.store.selection(start - margin, end + margin)
+    if aggregation == 'mean':
+        resolution = loaded.finest(ZOOMED_REFINEMENT['levels'], ZOOMED_REFINEMENT['max_points'])
+    if view is not None and view['resolution'] == resolution \
+            and pd.Timestamp(view['from']) <= start and end <= pd.Timestamp(view['till']):
+        return no_update, no_update
+
+    # the range slider keeps the span of the whole selection, so the range
+    # can be dragged anywhere in it, but like the chart it only draws the
+    # loaded data; the rest is drawn once the range gets there
+    slider_range = [str(min(start, pd.Timestamp(window.min_date))), str(max(end, pd.Timestamp(window.max_date)))]
+    fig = zoomed_patch(loaded, modes, resolution, aggregation, overlays, x_range, slider_range)
+    return fig, {'resolution': resolution, 'from': str(loaded.min_date), 'till': str(loaded.max_date)}
+
+
+# box selecting on the main chart and zooming the zoomed chart reach the
+# server as a selection request: the browser stamps every change with a
+# sequence number and only sends the last one of a quick burst, the server
+# drops a request once a newer one of the same tab has arrived
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="request_selection"),
+    Output("selection-request", "data"),
+    Input("time-series-chart", "selectedData"),
+    Input("zoomed-time-series-chart", "relayoutData")
+)
+
+
+@callback(
     Output("zoomed-time-series-chart", "figure"),
     Output("zoomed-div", "className"),
-    Input("time-series-chart", "selectedData"),
+    Output("zoomed-view", "data"),
+    Output("daytype-vis", "figure"),
+    Output("daytype-div", "className"),
+    Output("from-date", "date"),
+    Output("till-date", "date"),
+    Input("selection-request", "data"),
+    Input("from-date", "date"),
+    Input("till-date", "date"),
     Input('modes2', 'value'),
     Input('resolution2', 'value'),
     Input('aggregation2', 'value'),
-    Input('from-date', 'date'),
-    Input('till-date', 'date')
+    Input('overlay2', 'value'),
+    Input("resolution3", "value"),
+    Input("aggregation3", "value"),
+    State("time-series-chart", "selectedData"),
+    State("zoomed-time-series-chart", "relayoutData"),
+    State("zoomed-view", "data"),
+    State("session-id", "data"),
+    **background(
+        (Output("zoomed-time-series-chart", "className"), "opacity-50", ""),
+        (Output("daytype-vis", "className"), "opacity-50", "")
+    )
 )
-def display_zoomed_time_series(selectedData, modes, resolution, aggregation, min_date, max_date):
-    #print(selectedData)
-    if selectedData is None:
-        return px.line(), "d-none",
-    
-    if ctx.triggered_id == "time-series-chart":
+def update_selection(selection_request, min_date, max_date, modes, resolution, aggregation, overlays,
+                     daytype_resolution, daytype_aggregation, selectedData, relayoutData, view, session_id):
+    # one request per box select: the date pickers are outputs as well as
+    # inputs, so the dates written here do not call this callback again
+    triggered = set(ctx.triggered_prop_ids)
+    source = selection_request['source'] if ctx.triggered_id == "selection-request" else None
+    if source is not None and not latest_request(session_id, selection_request['seq']):
+        raise PreventUpdate
+    if source == "time-series-chart":
+        if selectedData is None:
+            return no_update, "d-none", None, no_update, no_update, None, None
         x_min, x_max = selectedData['range']['x']
-        min_date = x_min.split()[0]
-        max_date = x_max.split()[0]
+        min_date, max_date = x_min.split()[0], x_max.split()[0]
+        dates = min_date, max_date
+    else:
+        dates = no_update, no_update
+    if min_date is None or max_date is None:
+        return no_update, no_update, no_update, no_update, no_update, *dates
+
+    window = dataset.current().selection(min_date, max_date)
+    if source == "zoomed-time-series-chart":
+        # zooming and panning only redraws the zoomed chart; a reset draws
+        # the selection at the chosen resolution again
+        x_range = zoomed_range(relayoutData)
+        if selectedData is None or x_range is None or (x_range == 'auto' and view is None):
+            zoomed = no_update, no_update, no_update
+        elif x_range == 'auto':
+            zoomed = zoomed_patch(window, modes, resolution, aggregation, overlays), no_update, None
+        else:
+            fig, view = refined_patch(window, x_range, modes, resolution, aggregation, overlays, view)
+            zoomed = fig, no_update, view
+        return *zoomed, no_update, no_update, *dates
 
-    zoomed_df = get_df(
-        ridership_df,
-        min_date=min_date, max_date=max_date,
-        modes=modes, resolution=resolution, aggregation_method=aggregation
-    )
-    fig = px.line(zoomed_df, x="date", y=modes)
-    fig.update_layout(
-        margin={'t' : 5, 'b' : 0},
-        showlegend=False,
-        xaxis=dict(
-            title='Date',
-            rangeslider=dict(visible=True),
-            type='date'
-        )
-    )
-    return fig, ""
+    if selectedData is None:
+        zoomed = no_update, "d-none", None
+    elif triggered & ZOOMED_INPUTS:
+        zoomed = zoomed_patch(window, modes, resolution, aggregation, overlays), "", None
+    else:
+        zoomed = no_update, no_update, no_update
+    if triggered & DAYTYPE_INPUTS:
+        daytype = daytype_view(window, modes, daytype_resolution, daytype_aggregation), "mt-0"
+    else:
+        daytype = no_update, no_update
+    return *zoomed, *daytype, *dates
 
-@app.callback(
-    Output("from-date", "date"),
-    Output("till-date", "date"),
-    Input("time-series-chart", "selectedData"),
+
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="new_session"),
+    Output("session-id", "data"),
+    Input("session-id", "modified_timestamp"),
+    State("session-id", "data")
 )
-def set_datepicker(sel_box):
-    if sel_box is None:
-        return None, None
-    
-    min_date = sel_box['range']['x'][0].split()[0]
-    max_date = sel_box['range']['x'][1].split()[0]
-    
-    return min_date, max_date
 
 
-@app.callback(
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="show_table"),
     Output("select-row", "style"),
+    Output("daytype-row", "style"),
     Input("time-series-chart", "selectedData")
 )
-def show_table(selection):
-    #print(selection)
-    if selection is None:
-        return {'display' : 'none'}
-    
-    return {'display' : 'table-row'}
-
-@app.callback(
+
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="allow_select_customization"),
     Output("modes2", "options"),
     Output("resolution2", "options"),
     Output("aggregation2", "options"),
@@ -161,219 +552,119 @@ def show_table(selection):
     State("resolution2", "options"),
     State("aggregation2", "options")
 )
-def allow_select_customization(synchronization, modes1, resolution1, aggregation1, modes_opt, resolution_opt, aggregation_opt):
-    #print(synchronization, modes1, resolution1, aggregation1, modes_opt)
-    #print([{**opt, 'disabled' : True}
-    #        for opt in modes_opt])
-    if synchronization == ["same"]:
-        #print(modes_opt)
-        disabled_modes = [{**opt, 'disabled' : True} for opt in modes_opt]
-        disabled_resolution = [{**opt, 'disabled' : True} for opt in resolution_opt]
-        disabled_aggregation = [{**opt, 'disabled' : True} for opt in aggregation_opt]
-        #print(disabled_aggregation)
-        return disabled_modes, disabled_resolution, disabled_aggregation, modes1, resolution1, aggregation1
-    
-    enabled_modes = [{**opt, 'disabled' : False} for opt in modes_opt]
-    enabled_resolution = [{**opt, 'disabled' : False} for opt in resolution_opt]
-    enabled_aggregation = [{**opt, 'disabled' : False} for opt in aggregation_opt]
-
-    return enabled_modes, enabled_resolution, enabled_aggregation, no_update, no_update, no_update
-
-@app.callback(
-    Output("daytype-vis", "figure"),
-    Output("daytype-div", "className"),
-    Input("from-date", "date"),
-    Input("till-date", "date"),
-    Input("modes2", "value")
-)
-def update_daytype_visualizations(min_date, max_date, modes):
-    if min_date is None or max_date is None:
-        return no_update
-    
-    df = (
-        ridership_df.loc[
-            (min_date <= ridership_df['date']) & (ridership_df['date'] <= max_date),
-        ].assign(weekday = lambda x: x['day_type'] == "W")
-    )
-
-    #print(df.columns)
-    daytype_fig = px.line(
-        df, x='date', y=modes,
-        facet_col='weekday',
-        color_discrete_sequence=DAYTYPE_COLORS[:len(modes)]
-    )
-
-    return daytype_fig, "mt-0"
-
 
-
-
-@app.callback(
-    Output("dates", "data"),
+@callback(
     Output("comparison-div", "children"),
+    Output("close-comparison-bot", "children"),
     Input("save-button", "n_clicks"),
     State("from-date", "date"),
     State("till-date", "date"),
     State("modes2", "value"),
     Input({"type" : "dynamic-delete", "index" : ALL}, "n_clicks"),
-    State("comparison-div", "children"),
-    State("dates", "data")
+    State("session-id", "data")
 )
-def f(n, min_date, max_date, modes, _, children, dates):
-    if max_date is None or min_date is None:
-        return None, []
-    if dates is None:
-        dates = []
-    new_dates = []
-    
+def f(n, min_date, max_date, modes, _, session_id):
+    if session_id is None or ctx.triggered_id is None:
+        return no_update, no_update
+
+    store = dataset.current()
+    patched_children = Patch()
     if ctx.triggered_id == "save-button":
-        patched_children = Patch()
+        if max_date is None or min_date is None:
+            return no_update, no_update
+        unit = {'index' : n, 'min_date' : min_date, 'max_date' : max_date, 'modes' : modes, 'checked' : False}
+        with sessions.edit(session_id) as session:
+            # only the new timeframe's metrics are computed
+            session['matrix'] = comparison.add_unit(session.get('matrix'), store, session['units'], unit)
+            session['units'].append(unit)
+            units, matrix = session['units'], session['matrix']
         patched_children.append(
-            comparison_mode.make_comparison_unit(ridership_df, min_date, max_date, modes, n)
+            comparison_mode.make_comparison_unit(store, min_date, max_date, modes, n)
         )
-        new_dates = dates + [{'min_date' : min_date, 'max_date' : max_date}]
-        return new_dates, patched_children
+        return patched_children, comparison_mode.make_comparison_matrix(matrix, units)
 
     if ctx.triggered_id['type'] == 'dynamic-delete':
-        new_children = []
-        for i, child in enumerate(children):
-            if child['props']['id'] != f"comparison-{ctx.triggered_id['index']}":
-                new_dates.append(dates[i])
-                new_children.append(child)
-
-        return new_dates, new_children
+        with sessions.edit(session_id) as session:
+            indices = [unit['index'] for unit in session['units']]
+            if ctx.triggered_id['index'] not in indices:
+                return no_update, no_update
+            position = indices.index(ctx.triggered_id['index'])
+            del session['units'][position]
+            matrix = session.get('matrix')
+            if matrix is not None and matrix['version'] == store.version and matrix['index'] == indices:
+                session['matrix'] = comparison.remove_unit(matrix, position)
+            else:
+                session['matrix'] = comparison.compare(store, session['units'])
+            units, matrix = session['units'], session['matrix']
+        del patched_children[position]
+        return patched_children, comparison_mode.make_comparison_matrix(matrix, units)
 
 
-@app.callback(
-    Output('old_check', 'data'),
+@callback(
     Output('close-comparison-unit-left', 'children'),
     Output('close-comparison-unit-right', 'children'),
     Input({'type': 'comparison-unit-check', 'index': ALL}, 'value'),
-    State('close-comparison-unit-left', 'children'),
-    State('close-comparison-unit-right', 'children'),
-    State('comparison-div', 'children'),
-    State('dates', 'data'),
-    State('old_check', 'data')
-#    State({'type' : })
+    State('session-id', 'data')
 )
-def update_close_comparison_graph(check, left, right, children, dates, old): 
-    #print(old)
-
-    #print(ctx.triggered_id)
-    #print(check)
-    if check == []:
-        #print(f"{[1, 2, 3]}")
-        return [{'old' : check}], left, right
-
-    if len(old[0]['old']) < len(check):
-        return [{'old' : check}], left, right
-    triggered_index = None
-    for i, child in enumerate(children):
-        if child['props']['id'] == f'comparison-{ctx.triggered_id["index"]}':
-            triggered_index = i
-            break
-
-    def add_graph():
-        min_date = dates[triggered_index]['min_date']
-        max_date = dates[triggered_index]['max_date']
-        
-        graph = comparison_mode.make_close_comparison_unit(ridership_df, min_date, max_date, DEFAULT_MODES, ctx.triggered_id['index'])
-        if left['props']['class_name'] == 'default-container':
-            return graph, right
-        elif right['props']['class_name'] == 'default-container':
-            return left, graph
-        #print(1)
-    
-
-    def remove_graph():
-        #print(left['props']['id']['type'])
-        
-        if left['props']['class_name'] != 'default-container':
-            print(left['props']['id'], ctx.triggered_id)
-            if left['props']['id']['index'] == ctx.triggered_id['index']:
-                return comparison_mode.default_container, right
-            
-        if right['props']['class_name'] != 'default-container':
-            if right['props']['id']['index'] == ctx.triggered_id['index']:
-                return left, comparison_mode.default_container
-        
-        #print(2)
-    
-    #print(check, triggered_index)
-    #print(ctx.triggered_id)
-    print(left['props']['class_name'], right['props']['class_name'])
-    if check[triggered_index] == [True]:
-        left_graph, right_graph = add_graph()
-        return [{'old' : check}], left_graph, right_graph
-    
-    #print(1)
-    old_checked = 0
-    for el in old[0]['old']:
-        if el == [True]:
-            old_checked += 1
-
-    new_checked = 0
-    for el in check:
-        if el == [True]:
-            new_checked += 1
-    
-    if new_checked == old_checked:
-        return [{'old' : check}], no_update, no_update
-    
-    left_graph, right_graph = remove_graph()
-    return [{'old' : check}], left_graph, right_graph
-
-
-@app.callback(
+def update_close_comparison_graph(_, session_id):
+    if session_id is None:
+        return no_update, no_update
+
+    with sessions.edit(session_id) as session:
+        units = {unit['index'] : unit for unit in session['units']}
+
+        # only the check that changed is read; deleting a unit also lands
+        # here, then without a triggered check
+        triggered = ctx.triggered_id
+        if isinstance(triggered, dict) and triggered['index'] in units:
+            units[triggered['index']]['checked'] = ctx.triggered[0]['value'] == [True]
+
+        slots = list(session['slots'])
+        for i, index in enumerate(slots):
+            if index is not None and (index not in units or not units[index]['checked']):
+                slots[i] = None
+        for index, unit in units.items():
+            if unit['checked'] and index not in slots and None in slots:
+                slots[slots.index(None)] = index
+
+        old_slots, session['slots'] = session['slots'], slots
+
+    def render(index):
+        if index is None:
+            return comparison_mode.default_container
+        unit = units[index]
+        return comparison_mode.make_close_comparison_unit(
+            dataset.current(), unit['min_date'], unit['max_date'], DEFAULT_MODES, index
+        )
+
+    return tuple(
+        render(new) if new != old else no_update
+        for old, new in zip(old_slots, slots)
+    )
+
+
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="disable_comparison_unit_checks"),
     Output({'type': 'comparison-unit-check', 'index': ALL}, 'options'),
     Input({'type': 'comparison-unit-check', 'index': ALL}, 'value'),
     State({'type': 'comparison-unit-check', 'index': ALL}, 'options')
 )
-def disable_comparison_unit_checks(check, opts):
-    val = 0
-    #print(opts)
-    for c in check:
-        if c == [True]:
-            val += 1
-    #print(val)
-
-    new_options = []
-    if val == 2:
-        for i, opt in enumerate(opts):
-            #print(opt)
-            if check[i] == [True]:
-                new_options.append(opt)
-            else:
-                new_options.append([{**opt[0], 'disabled': True}])
-    else:
-        for opt in opts:
-            #print(opt)
-            new_options.append([{**opt[0], 'disabled': False}])
 
-    return new_options
 
-    
-    #if left['props']['id']['type'] == 'default-container':
-
-        
-@app.callback(
-    #Output({'type': 'comparison-unit-check', 'index': ALL}, 'value'),
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="remove_deleted_graph1"),
     Input({"type" : "dynamic-delete", "index" : ALL}, "n_clicks"),
     State({'type': 'comparison-unit-check', 'index': ALL}, 'value')
 )
-def remove_deleted_graph1(_, old_checkbox):
-    print(ctx.triggered_id)
-    print(old_checkbox)
-    #print(check)
-    #return no_update
 
-@app.callback(
+
+clientside_callback(
+    ClientsideFunction(namespace="ui", function_name="fun"),
     Input("save-button", "n_clicks"),
     State("close-comparison-unit-left", "children")
 )
-def fun(_, component):
-    print(component['props'].keys())
 
 
-app.run(debug=True)
+if __name__ == '__main__':
+    create_app().run(debug=True)
 
@@ -0,0 +1,76 @@
+// a selection request superseded within this many milliseconds is never sent
+const SELECTION_DEBOUNCE_MS = 100;
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ui: {
+        new_session: function(_, session_id) {
+            if (session_id) {
+                return window.dash_clientside.no_update;
+            }
+            if (window.crypto.randomUUID) {
+                return window.crypto.randomUUID();
+            }
+            // randomUUID only exists in secure contexts (https, localhost)
+            const bytes = window.crypto.getRandomValues(new Uint8Array(16));
+            return Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+        },
+
+        request_selection: function(selection, relayout) {
+            const no_update = window.dash_clientside.no_update;
+            const source = window.dash_clientside.callback_context.triggered_id;
+            const moved = relayout && ('xaxis.range' in relayout || 'xaxis.range[0]' in relayout
+                                       || 'xaxis.autorange' in relayout);
+            if (!source || (source === 'zoomed-time-series-chart' && !moved)) {
+                return no_update;
+            }
+            // increasing across page loads, the server drops older ones
+            const seq = Math.max(Date.now(), (window.selection_seq || 0) + 1);
+            window.selection_seq = seq;
+            return new Promise((resolve) => setTimeout(() => resolve(
+                seq === window.selection_seq ? {'seq' : seq, 'source' : source} : no_update
+            ), SELECTION_DEBOUNCE_MS));
+        },
+
+        show_table: function(selection) {
+            if (selection === null || selection === undefined) {
+                return [{'display' : 'none'}, {'display' : 'none'}];
+            }
+            return [{'display' : 'table-row'}, {'display' : 'table-row'}];
+        },
+
+        allow_select_customization: function(synchronization, modes1, resolution1, aggregation1,
+                                              modes_opt, resolution_opt, aggregation_opt) {
+            const no_update = window.dash_clientside.no_update;
+            const same = Array.isArray(synchronization)
+                && synchronization.length === 1 && synchronization[0] === 'same';
+            const set_disabled = (opts) => opts.map((opt) => ({...opt, 'disabled' : same}));
+
+            if (same) {
+                return [set_disabled(modes_opt), set_disabled(resolution_opt), set_disabled(aggregation_opt),
+                        modes1, resolution1, aggregation1];
+            }
+            return [set_disabled(modes_opt), set_disabled(resolution_opt), set_disabled(aggregation_opt),
+                    no_update, no_update, no_update];
+        },
+
+        disable_comparison_unit_checks: function(check, opts) {
+            const is_checked = (c) => Array.isArray(c) && c.length === 1 && c[0] === true;
+            const val = check.filter(is_checked).length;
+
+            if (val === 2) {
+                return opts.map((opt, i) =>
+                    is_checked(check[i]) ? opt : [{...opt[0], 'disabled' : true}]);
+            }
+            return opts.map((opt) => [{...opt[0], 'disabled' : false}]);
+        },
+
+        remove_deleted_graph1: function(_, old_checkbox) {
+            console.log(window.dash_clientside.callback_context.triggered_id);
+            console.log(old_checkbox);
+        },
+
+        fun: function(_, component) {
+            console.log(Object.keys(component['props']));
+        }
+    }
+});
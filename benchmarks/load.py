@@ -0,0 +1,35 @@
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.dataset import CLEAN_CSV, ensure_columns, load_ridership, read_csv
+
+REPEAT = 20
+
+
+def timed(fun, repeat=REPEAT):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), min(timings)
+
+
+def main():
+    ensure_columns(CLEAN_CSV)
+    results = {
+        'csv (read_csv + parse_dates + sort)': timed(lambda: read_csv(CLEAN_CSV)),
+        'columns, checksum + mmap': timed(lambda: load_ridership(CLEAN_CSV)),
+        'columns, checksum + read': timed(lambda: load_ridership(CLEAN_CSV, mmap=False)),
+    }
+    print(f"startup load of {CLEAN_CSV}, median / best of {REPEAT}")
+    for name, (median, best) in results.items():
+        print(f"  {name:<40} {median * 1000:8.2f} ms {best * 1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,346 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the server callbacks by name, each identified by its first output
+CALLBACKS = {
+    'display_time_series': 'time-series-chart.figure',
+    'update_selection': 'zoomed-time-series-chart.figure',
+    'f': 'comparison-div.children',
+    'update_close_comparison_graph': 'close-comparison-unit-left.children'
+}
+
+FIRST_DAY, LAST_DAY = datetime.date(2001, 1, 1), datetime.date(2024, 12, 31)
+RANGE_DAYS = [7, 30, 90, 365, 730]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, threads):
+    """gunicorn with the production config on a free local port."""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        'CITY_BIND': f"127.0.0.1:{port}",
+        'CITY_WORKERS': str(workers),
+        'CITY_THREADS': str(threads)
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url + "/_dash-layout", timeout=5).read()
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("gunicorn did not come up")
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def layout_values(node, values=None):
+    """{'id.prop': value} of every component with an id in the layout, the
+    values a browser starts its callbacks with."""
+    values = {} if values is None else values
+    if isinstance(node, list):
+        for child in node:
+            layout_values(child, values)
+    elif isinstance(node, dict) and 'props' in node:
+        props = node['props']
+        if isinstance(props.get('id'), str):
+            for prop, value in props.items():
+                values[f"{props['id']}.{prop}"] = value
+        layout_values(props.get('children'), values)
+    return values
+
+
+def callback_specs(url):
+    specs = {}
+    for dependency in get_json(url + "/_dash-dependencies"):
+        if dependency.get('clientside_function'):
+            continue
+        outputs = [
+            dict(zip(('id', 'property'), output.rsplit('.', 1)))
+            for output in dependency['output'].strip('.').split('...')
+        ]
+        specs[f"{outputs[0]['id']}.{outputs[0]['property']}"] = {**dependency, 'outputs': outputs}
+    return {name: specs[output] for name, output in CALLBACKS.items()}
+
+
+def entry(spec, values):
+    # pattern matching inputs are read from values['<type>.<prop>'], a list
+    # of (index, value) of the components that are on the page
+    if spec['id'].startswith('{'):
+        kind = json.loads(spec['id'])['type']
+        return [
+            {'id': {'index': index, 'type': kind}, 'property': spec['property'], 'value': value}
+            for index, value in values.get(f"{kind}.{spec['property']}", [])
+        ]
+    return {'id': spec['id'], 'property': spec['property'], 'value': values.get(f"{spec['id']}.{spec['property']}")}
+
+
+def payload(spec, values, changed):
+    """The body the dash renderer posts to /_dash-update-component."""
+    outputs = spec['outputs']
+    return {
+        'output': spec['output'],
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': [entry(i, values) for i in spec['inputs']],
+        'state': [entry(s, values) for s in spec['state']],
+        'changedPropIds': changed
+    }
+
+
+def pattern_id(kind, index, prop):
+    return f"{json.dumps({'index': index, 'type': kind}, sort_keys=True, separators=(',', ':'))}.{prop}"
+
+
+class Session:
+    """One dashboard tab: the browser side values the callbacks read and the
+    saved timeframes on the page. Every callback call is timed into `record`
+    with its error, if any; background callbacks up to the poll that brings
+    the result."""
+
+    def __init__(self, url, specs, initial, record, rng, think):
+        self.url = url
+        self.specs = specs
+        self.values = dict(initial)
+        self.values['session-id.data'] = str(uuid.uuid4())
+        self.record = record
+        self.rng = rng
+        self.think = think
+        self.units = []
+
+    def post(self, query, body):
+        request = urllib.request.Request(
+            self.url + "/_dash-update-component" + query, data=body,
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def call(self, name, changed, values=None):
+        self.values.update(values or {})
+        spec = self.specs[name]
+        body = json.dumps(payload(spec, self.values, changed)).encode()
+        start = time.perf_counter()
+        try:
+            status, data = self.post("", body)
+            if status == 200 and spec.get('background'):
+                job = json.loads(data)
+                interval = spec['background'].get('interval', 1000) / 1000
+                deadline = time.perf_counter() + 60
+                while status == 200 and 'response' not in json.loads(data) and time.perf_counter() < deadline:
+                    time.sleep(interval)
+                    status, data = self.post(f"?cacheKey={job['cacheKey']}&job={job['job']}", body)
+            if status == 204 or (status == 200 and 'response' in json.loads(data)):
+                error = None
+            else:
+                error = f"HTTP {status}" if status != 200 else "no result"
+        except (OSError, ValueError, KeyError) as e:
+            error = type(e).__name__
+        self.record(name, time.perf_counter() - start, error)
+        if self.think:
+            time.sleep(self.rng.uniform(0, 2 * self.think))
+        return error is None
+
+    def open(self):
+        # a page load: the layout, then the main chart drawn with the defaults
+        start = time.perf_counter()
+        try:
+            get_json(self.url + "/_dash-layout")
+            error = None
+        except (OSError, ValueError) as e:
+            error = type(e).__name__
+        self.record('layout', time.perf_counter() - start, error)
+        self.call('display_time_series', [])
+
+    def random_range(self):
+        days = self.rng.choice(RANGE_DAYS)
+        start = FIRST_DAY + datetime.timedelta(self.rng.randrange((LAST_DAY - FIRST_DAY).days - days))
+        return start.isoformat(), (start + datetime.timedelta(days)).isoformat()
+
+    def request_selection(self, source, values):
+        # box selects and zooms reach the server through the selection
+        # request the browser stamps with a sequence number
+        request = {'seq': time.time_ns() // 1000000, 'source': source}
+        return self.call('update_selection', ['selection-request.data'], {**values, 'selection-request.data': request})
+
+    def select(self):
+        lo, hi = self.random_range()
+        selected = {'points': [], 'range': {'x': [f"{lo} 00:00:00", f"{hi} 23:59:59.999"], 'y': [0, 2e6]}}
+        if self.request_selection('time-series-chart', {'time-series-chart.selectedData': selected}):
+            self.values.update({'from-date.date': lo, 'till-date.date': hi})
+
+
+def browse(session):
+    """Toggles the main chart's modes and resolution."""
+    rng = session.rng
+    for _ in range(3):
+        modes = rng.choice([['bus', 'rail'], ['bus'], ['rail']])
+        session.call('display_time_series', ['modes1.value'], {'modes1.value': modes})
+        session.call('display_time_series', ['resolution1.value'], {'resolution1.value': rng.choice(['D', 'W', 'M'])})
+
+
+def select(session):
+    """Box-selects a range, zooms the zoomed chart to another one, then
+    changes the day type and zoomed views."""
+    rng = session.rng
+    session.select()
+    lo, hi = session.random_range()
+    session.request_selection('zoomed-time-series-chart',
+                              {'zoomed-time-series-chart.relayoutData': {'xaxis.range[0]': lo, 'xaxis.range[1]': hi}})
+    session.call('update_selection', ['resolution3.value'], {'resolution3.value': rng.choice(['D', 'W', 'M', 'Q', 'Y'])})
+    session.call('update_selection', ['overlay2.value'], {'overlay2.value': rng.sample(['7', '28', '365', 'yoy'], 2)})
+
+
+def compare(session):
+    """Saves two timeframes, compares them closely, then deletes the oldest."""
+    for _ in range(2):
+        session.select()
+        clicks = (session.values.get('save-button.n_clicks') or 0) + 1
+        if session.call('f', ['save-button.n_clicks'], {'save-button.n_clicks': clicks}):
+            session.units.append(clicks)
+        session.values['comparison-unit-check.value'] = [(index, None) for index in session.units]
+        session.values['dynamic-delete.n_clicks'] = [(index, None) for index in session.units]
+
+    for index in session.units[-2:]:
+        checks = dict(session.values['comparison-unit-check.value'])
+        checks[index] = [True]
+        session.values['comparison-unit-check.value'] = list(checks.items())
+        session.call('update_close_comparison_graph', [pattern_id('comparison-unit-check', index, 'value')])
+
+    index = session.units.pop(0)
+    session.values['dynamic-delete.n_clicks'] = [(i, 1 if i == index else None) for i in [index] + session.units]
+    session.call('f', [pattern_id('dynamic-delete', index, 'n_clicks')])
+    session.values['dynamic-delete.n_clicks'] = [(i, None) for i in session.units]
+    session.values['comparison-unit-check.value'] = [
+        (i, value) for i, value in session.values['comparison-unit-check.value'] if i != index
+    ]
+
+
+SCRIPTS = {'browse': browse, 'select': select, 'compare': compare}
+
+
+def percentile(values, q):
+    # nearest rank
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values) + 0.5)) - 1))]
+
+
+def run_level(url, specs, initial, concurrency, seconds, scripts, think, seed):
+    """`concurrency` sessions replaying random scripts for `seconds`."""
+    samples = {}
+    lock = threading.Lock()
+    stop = time.time() + seconds
+
+    def record(name, elapsed, error):
+        with lock:
+            samples.setdefault(name, []).append((elapsed, error))
+
+    def user(n):
+        rng = random.Random(seed * 1000 + n)
+        session = Session(url, specs, initial, record, rng, think)
+        session.open()
+        while time.time() < stop:
+            SCRIPTS[rng.choice(scripts)](session)
+
+    threads = [threading.Thread(target=user, args=(n,)) for n in range(concurrency)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    results = {}
+    for name, calls in sorted(samples.items()):
+        times = [t * 1000 for t, _ in calls]
+        errors = {}
+        for _, error in calls:
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+        results[name] = {
+            'calls': len(calls), 'p50_ms': percentile(times, 50), 'p95_ms': percentile(times, 95),
+            'p99_ms': percentile(times, 99), 'error_rate': sum(errors.values()) / len(calls), 'errors': errors
+        }
+    calls = sum(r['calls'] for r in results.values())
+    errors = sum(r['error_rate'] * r['calls'] for r in results.values())
+    return {
+        'concurrency': concurrency, 'seconds': elapsed, 'calls': calls,
+        'calls_per_s': calls / elapsed, 'error_rate': errors / calls if calls else 0.0,
+        'callbacks': results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="replays dashboard sessions against the app at rising concurrency")
+    parser.add_argument("--url", help="app to load, by default one is started with gunicorn.conf.py")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers of the started app")
+    parser.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker of the started app")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=10, help="duration of every concurrency level")
+    parser.add_argument("--scripts", nargs="+", choices=sorted(SCRIPTS), default=sorted(SCRIPTS))
+    parser.add_argument("--think", type=float, default=0, help="mean pause between a session's callbacks, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.workers, args.threads)
+    try:
+        specs = callback_specs(url)
+        initial = layout_values(get_json(url + "/_dash-layout"))
+        levels = []
+        for concurrency in args.concurrency:
+            level = run_level(url, specs, initial, concurrency, args.seconds, args.scripts, args.think, args.seed)
+            levels.append(level)
+            print(f"\nconcurrency {concurrency}: {level['calls']} calls, {level['calls_per_s']:.1f} calls/s, "
+                  f"{100 * level['error_rate']:.1f}% errors")
+            print(f"{'callback':<32} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+            for name, r in level['callbacks'].items():
+                print(f"{name:<32} {r['calls']:6d} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} "
+                      f"{100 * r['error_rate']:6.1f}%  {', '.join(f'{e} x{n}' for e, n in r['errors'].items())}")
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+            process.wait(timeout=30)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(levels, f, indent=1)
+    return 1 if any(level['error_rate'] for level in levels) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+PHASES = ['interpreter', 'import', 'dataset', 'first_request']
+TOLERANCE = 0.1
+
+
+def rss_kb():
+    # resident set of this process right now; the peak where /proc is missing
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def nbytes(value):
+    """Bytes held by the arrays in `value` (nested dicts, lists, frames)."""
+    import pandas as pd
+
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+    if hasattr(value, '__dict__'):
+        return nbytes(vars(value))
+    return 0
+
+
+def child():
+    # runs in a fresh interpreter, see measure()
+    rss = {'interpreter': rss_kb()}
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import app
+    from components import comparison_mode
+    rss['import'] = rss_kb()
+
+    comparison_mode.figure_cache.disk_dir = None
+    dash_app = app.create_app(watch=False)
+    rss['dataset'] = rss_kb()
+
+    client = dash_app.server.test_client()
+    assert client.get("/").status_code == 200
+    rss['first_request'] = rss_kb()
+
+    store = app.dataset.current()
+    sizes = {
+        'data': nbytes(store.data),
+        'dates': nbytes(store.dates),
+        'cube': nbytes(store.cube),
+        # the cube and the count columns are shared with the store, counted above
+        'daytypes': {k: v for k, v in vars(store.daytypes).items() if k not in ('cube', 'columns')},
+        'rolling_stats': nbytes(store.rolling_stats)
+    }
+    sizes['daytypes'] = nbytes(sizes['daytypes'])
+    print(json.dumps({'rss': rss, 'sizes': sizes}))
+
+
+def measure(runs):
+    """Median resident memory after every phase over `runs` fresh
+    interpreters, and the bytes held by each part of the store."""
+    rss = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child"],
+            check=True, capture_output=True, text=True, cwd=ROOT
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        for phase in PHASES:
+            rss[phase].append(result['rss'][phase])
+    return {phase: statistics.median(values) for phase, values in rss.items()}, result['sizes']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="resident memory of the app and size of the dataset in memory")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--save", action="store_true", help="store the results in the benchmark baseline")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return 0
+
+    rss, sizes = measure(args.runs)
+    results = {f"memory/rss/{phase}": {'rss_kb': kb} for phase, kb in rss.items()}
+    results.update({f"memory/store/{part}": {'size_bytes': size} for part, size in sizes.items()})
+
+    print(f"{'part':<40} {'KiB':>9}")
+    for name, result in results.items():
+        kb = result['rss_kb'] if 'rss_kb' in result else result['size_bytes'] / 1024
+        print(f"{name:<40} {kb:9.1f}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"saved {len(results)} results to {args.baseline}")
+        return 0
+
+    regressions = [
+        (name, metric, baseline[name][metric], value)
+        for name, result in results.items() if name in baseline
+        for metric, value in result.items()
+        if metric in baseline[name] and value > baseline[name][metric] * (1 + TOLERANCE)
+    ]
+    for name, metric, before, after in regressions:
+        print(f"REGRESSION {name} {metric}: {before:.0f} -> {after:.0f}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+PHASES = ['import', 'create_app', 'first_request', 'layout', 'total']
+TOLERANCE = 0.5
+
+
+def child(disk_dir):
+    # runs in a fresh interpreter, see measure()
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import app
+    from components import comparison_mode
+    imported = time.perf_counter()
+
+    comparison_mode.figure_cache.disk_dir = disk_dir
+    dash_app = app.create_app(watch=False, warm=False)
+    created = time.perf_counter()
+
+    client = dash_app.server.test_client()
+    assert client.get("/").status_code == 200
+    first = time.perf_counter()
+    assert client.get("/_dash-layout").status_code == 200
+    layout = time.perf_counter()
+
+    print(json.dumps({
+        'import': imported - start,
+        'create_app': created - imported,
+        'first_request': first - created,
+        'layout': layout - first,
+        'total': layout - start
+    }))
+
+
+def measure(runs, disk_dir):
+    """Median of every phase over `runs` starts, each in a fresh interpreter
+    so nothing is imported yet; `disk_dir()` gives the figure cache
+    directory of every run."""
+    timings = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", disk_dir()],
+            check=True, capture_output=True, text=True, cwd=ROOT
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        for phase in PHASES:
+            timings[phase].append(result[phase])
+    return {phase: statistics.median(values) * 1000 for phase, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cold start time of the app, phase by phase")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save", action="store_true", help="store the results in the benchmark baseline")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--child", metavar="DISK_DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return 0
+
+    with tempfile.TemporaryDirectory() as scratch:
+        # cold starts build the main figure, warm ones find it in the figure
+        # cache an earlier process left on disk
+        cold = measure(args.runs, lambda: tempfile.mkdtemp(dir=scratch))
+        shared = tempfile.mkdtemp(dir=scratch)
+        measure(1, lambda: shared)
+        warm = measure(args.runs, lambda: shared)
+    results = {}
+    for name, timings in [('cold', cold), ('warm', warm)]:
+        for phase, ms in timings.items():
+            results[f"startup/{name}/{phase}"] = {'time_ms': ms}
+
+    print(f"{'phase':<40} {'time ms':>9}")
+    for name, result in results.items():
+        print(f"{name:<40} {result['time_ms']:9.1f}")
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"saved {len(results)} results to {args.baseline}")
+        return 0
+
+    regressions = [
+        (name, baseline[name]['time_ms'], result['time_ms'])
+        for name, result in results.items()
+        if name in baseline and result['time_ms'] > baseline[name]['time_ms'] * (1 + TOLERANCE)
+    ]
+    for name, before, after in regressions:
+        print(f"REGRESSION {name} time_ms: {before:.1f} -> {after:.1f}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
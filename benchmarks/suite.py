@@ -0,0 +1,293 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from contextvars import copy_context
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pandas as pd
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from plotly.io.json import to_json_plotly
+
+import app
+from components import comparison_mode
+from utils import comparison, figures
+from utils.session import SessionStore
+from utils.utils import get_df
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# how much worse than the baseline a case may get before it counts as a
+# regression; wall time is noisy, bytes are not
+TOLERANCE = {'time_ms': 0.5, 'peak_kb': 0.25, 'size_bytes': 0.05}
+
+RESOLUTIONS = ['D', 'W', 'M', 'Q', 'Y']
+AGGREGATIONS = ['mean', 'sum']
+WINDOWS = {
+    '1w': ('2019-03-04', '2019-03-10'),
+    '3m': ('2019-01-01', '2019-03-31'),
+    '1y': ('2019-01-01', '2019-12-31'),
+    '5y': ('2015-01-01', '2019-12-31'),
+    'all': ('2001-01-01', '2024-12-31')
+}
+
+CASES = {}
+SESSION = "00000000-0000-0000-0000-000000000000"
+
+
+def case(name):
+    def register(fun):
+        CASES[name] = fun
+        return fun
+    return register
+
+
+def selected_data(min_date, max_date):
+    # what plotly sends for a box selection on the main chart
+    return {'points': [], 'range': {'x': [f"{min_date} 00:00:00", f"{max_date} 23:59:59.999"], 'y': [0, 2e6]}}
+
+
+def selection_request(source):
+    # what the browser's request_selection sends for a change of `source`
+    return {'seq': time.time_ns() // 1000000, 'source': source}
+
+
+def run_callback(fun, triggered, *args, value=None):
+    """Calls a registered callback directly with `triggered` (a prop id such
+    as 'save-button.n_clicks') as the triggering input."""
+    def call():
+        context_value.set(AttributeDict(triggered_inputs=[{'prop_id': triggered, 'value': value}]))
+        return fun(*args)
+    return copy_context().run(call)
+
+
+def register_cases(store):
+    for resolution in RESOLUTIONS:
+        for aggregation in AGGREGATIONS:
+            for window, (min_date, max_date) in WINDOWS.items():
+                case(f"get_df/{resolution}/{aggregation}/{window}")(
+                    lambda r=resolution, a=aggregation, lo=min_date, hi=max_date:
+                        get_df(store, lo, hi, ['bus', 'rail'], r, a)
+                )
+
+    for resolution in RESOLUTIONS:
+        for window, (min_date, max_date) in WINDOWS.items():
+            case(f"split_daytypes/{resolution}/mean/{window}")(
+                lambda r=resolution, lo=min_date, hi=max_date:
+                    store.split_daytypes(lo, hi, ['bus', 'rail'], r, 'mean')
+            )
+
+    for window, (min_date, max_date) in WINDOWS.items():
+        case(f"comparison_mode.get_window_df/{window}")(
+            lambda lo=min_date, hi=max_date:
+                comparison_mode.get_window_df(store, lo, hi, ['bus', 'rail'])
+        )
+        for kind, builder in comparison_mode.FIGURE_BUILDERS.items():
+            case(f"comparison_mode.{kind}/{window}")(
+                lambda b=builder, lo=min_date, hi=max_date: b(store, lo, hi, ['bus', 'rail'])
+            )
+
+    # figure construction alone, from data computed up front
+    for window, (min_date, max_date) in WINDOWS.items():
+        df = store.window(min_date, max_date, ['bus', 'rail'])
+        split = store.split_daytypes(min_date, max_date, ['bus', 'rail'], 'D', 'mean')
+        case(f"figures.frame_figure/{window}")(
+            lambda df=df: figures.frame_figure(df, ['bus', 'rail'], 'comparison', line={'width': 1})
+        )
+        case(f"figures.daytype_figure/{window}")(
+            lambda split=split: figures.daytype_figure(split, ['bus', 'rail'], 'comparison')
+        )
+    case("app.make_main_figure")(lambda: app.make_main_figure(store))
+    case("app.make_zoomed_figure")(app.make_zoomed_figure)
+
+    for window, (min_date, max_date) in WINDOWS.items():
+        for rolling in (7, 28, 365):
+            case(f"rolling/{rolling}/{window}")(
+                lambda w=rolling, lo=min_date, hi=max_date: store.rolling(lo, hi, ['bus', 'rail'], w)
+            )
+        case(f"year_over_year/D/mean/{window}")(
+            lambda lo=min_date, hi=max_date: store.year_over_year(lo, hi, ['bus', 'rail'], 'D', 'mean')
+        )
+
+    for resolution in ['D', 'W', 'M']:
+        case(f"callback.display_time_series/{resolution}")(
+            lambda r=resolution: run_callback(
+                app.display_time_series, 'resolution1.value', ['bus', 'rail'], r, 'mean', [])
+        )
+    case("callback.display_time_series/W/overlays")(
+        lambda: run_callback(
+            app.display_time_series, 'overlay1.value', ['bus', 'rail'], 'W', 'mean', ['28', '365', 'yoy'])
+    )
+
+    for window, (min_date, max_date) in WINDOWS.items():
+        case(f"callback.update_selection/select/{window}")(
+            lambda lo=min_date, hi=max_date: run_callback(
+                app.update_selection, 'selection-request.data', selection_request('time-series-chart'),
+                None, None, ['bus', 'rail'], 'D', 'mean', [], 'D', 'mean', selected_data(lo, hi), None, None, None)
+        )
+        case(f"callback.update_selection/select/overlays/{window}")(
+            lambda lo=min_date, hi=max_date: run_callback(
+                app.update_selection, 'selection-request.data', selection_request('time-series-chart'),
+                None, None, ['bus', 'rail'], 'D', 'mean', ['7', '28', 'yoy'], 'D', 'mean', selected_data(lo, hi),
+                None, None, None)
+        )
+        case(f"callback.update_selection/daytype/{window}")(
+            lambda lo=min_date, hi=max_date: run_callback(
+                app.update_selection, 'resolution3.value', selection_request('time-series-chart'),
+                lo, hi, ['bus', 'rail'], 'D', 'mean', [], 'D', 'mean', selected_data(lo, hi), None, None, None)
+        )
+
+    # zooming the zoomed chart of the whole history into each window
+    first, last = (str(d)[:10] for d in (store.dates[0], store.dates[-1]))
+    for window, (min_date, max_date) in WINDOWS.items():
+        case(f"callback.update_selection/zoom/{window}")(
+            lambda lo=min_date, hi=max_date: run_callback(
+                app.update_selection, 'selection-request.data', selection_request('zoomed-time-series-chart'),
+                first, last, ['bus', 'rail'], 'D', 'mean', ['7', '28', 'yoy'], 'D', 'mean', selected_data(first, last),
+                {'xaxis.range[0]': f"{lo} 00:00:00", 'xaxis.range[1]': f"{hi} 23:59:59.999"}, None, None)
+        )
+
+    saved = [WINDOWS['3m'], WINDOWS['1y'], WINDOWS['5y']]
+    units = [
+        {'index': n, 'min_date': lo, 'max_date': hi, 'modes': ['bus', 'rail'], 'checked': False}
+        for n, (lo, hi) in enumerate(saved)
+    ]
+    matrix = comparison.compare(store, units)
+    case("comparison.compare/3")(lambda: comparison.compare(store, units))
+    case("comparison.compare/12")(lambda: comparison.compare(store, [
+        {'index': n, 'min_date': lo, 'max_date': hi, 'modes': ['bus', 'rail']}
+        for n, (lo, hi) in enumerate(list(WINDOWS.values()) * 2 + saved)
+    ]))
+    case("comparison.add_unit")(lambda: comparison.add_unit(matrix, store, units, {
+        'index': len(units), 'min_date': WINDOWS['1w'][0], 'max_date': WINDOWS['1w'][1], 'modes': ['bus', 'rail']
+    }))
+
+    def with_session(fun, checked=()):
+        # every call starts from the same three saved timeframes
+        def call():
+            with app.sessions.edit(SESSION) as session:
+                session['units'] = [dict(unit, checked=unit['index'] in checked) for unit in units]
+                session['slots'] = [None, None]
+                session['matrix'] = matrix
+            return fun()
+        return call
+
+    case("callback.f/save")(with_session(
+        lambda: run_callback(
+            app.f, 'save-button.n_clicks', len(saved), *WINDOWS['1w'], ['bus', 'rail'],
+            [None] * len(saved), SESSION)
+    ))
+    case("callback.f/delete")(with_session(
+        lambda: run_callback(
+            app.f, '{"index":1,"type":"dynamic-delete"}.n_clicks', len(saved), *WINDOWS['1w'],
+            ['bus', 'rail'], [None, 1, None], SESSION)
+    ))
+    case("callback.update_close_comparison_graph/check")(with_session(
+        lambda: run_callback(
+            app.update_close_comparison_graph, '{"index":1,"type":"comparison-unit-check"}.value',
+            [[], [True], []], SESSION, value=[True])
+    ))
+
+
+def serialized_size(result):
+    if isinstance(result, pd.DataFrame):
+        return len(result.to_json(orient='split', date_format='iso'))
+    if isinstance(result, dict) and all(isinstance(v, pd.DataFrame) for v in result.values()):
+        return sum(serialized_size(v) for v in result.values())
+    return len(to_json_plotly(result))
+
+
+def measure(fun, min_time=0.2, max_repeat=1000):
+    # fresh figure cache for every call, so the builders are measured and
+    # not cache hits
+    def call():
+        comparison_mode.figure_cache.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fun()
+
+    result = call()
+    timings = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < 5 or (time.perf_counter() < deadline and len(timings) < max_repeat):
+        start = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    call()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'time_ms': statistics.median(timings) * 1000,
+        'peak_kb': peak / 1024,
+        'size_bytes': serialized_size(result)
+    }
+
+
+def compare(results, baseline):
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        for metric, tolerance in TOLERANCE.items():
+            before, after = baseline[name][metric], result[metric]
+            if after > before * (1 + tolerance) and after - before > 1e-3:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks for the data functions and the callbacks")
+    parser.add_argument("-k", dest="pattern", default="", help="only run cases whose name contains this")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args()
+
+    comparison_mode.figure_cache.disk_dir = None
+    app.sessions = SessionStore()
+    app.load_dataset()
+    register_cases(app.dataset.current())
+
+    results = {}
+    print(f"{'case':<60} {'time ms':>9} {'peak KiB':>9} {'bytes':>9}")
+    for name, fun in CASES.items():
+        if args.pattern not in name:
+            continue
+        results[name] = measure(fun)
+        r = results[name]
+        print(f"{name:<60} {r['time_ms']:9.3f} {r['peak_kb']:9.1f} {r['size_bytes']:9d}")
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"saved {len(results)} results to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"no baseline at {args.baseline}, run with --save first")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f))
+    for name, metric, before, after in regressions:
+        print(f"REGRESSION {name} {metric}: {before:.3f} -> {after:.3f}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# one display_time_series call, the heaviest callback every session triggers
+PAYLOAD = json.dumps({
+    'output': 'time-series-chart.figure',
+    'outputs': {'id': 'time-series-chart', 'property': 'figure'},
+    'inputs': [
+        {'id': 'modes1', 'property': 'value', 'value': ['bus', 'rail']},
+        {'id': 'resolution1', 'property': 'value', 'value': 'D'},
+        {'id': 'aggregation1', 'property': 'value', 'value': 'mean'},
+        {'id': 'overlay1', 'property': 'value', 'value': []}
+    ],
+    'changedPropIds': ['resolution1.value'],
+    'state': []
+}).encode()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_workers(master, workers, url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if len(master.children()) >= workers:
+            try:
+                urllib.request.urlopen(url + "/_dash-layout", timeout=5).read()
+                return
+            except OSError:
+                pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn did not come up")
+
+
+def memory(master):
+    processes = [master] + master.children()
+    infos = [p.memory_full_info() for p in processes]
+    return {
+        'rss_mb': sum(i.rss for i in infos) / 2**20,
+        'pss_mb': sum(i.pss for i in infos) / 2**20,
+        'uss_mb': sum(i.uss for i in infos) / 2**20
+    }
+
+
+def throughput(url, seconds, concurrency):
+    done = []
+    stop = time.time() + seconds
+
+    def client():
+        count = 0
+        while time.time() < stop:
+            request = urllib.request.Request(
+                url + "/_dash-update-component", data=PAYLOAD,
+                headers={'Content-Type': 'application/json'}
+            )
+            urllib.request.urlopen(request, timeout=30).read()
+            count += 1
+        done.append(count)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(done) / seconds
+
+
+def measure(workers, preload, seconds, concurrency):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        'CITY_BIND': f"127.0.0.1:{port}",
+        'CITY_WORKERS': str(workers),
+        'CITY_PRELOAD': "1" if preload else "0"
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        master = psutil.Process(process.pid)
+        wait_for_workers(master, workers, url)
+        result = {'workers': workers, 'preload': preload, **memory(master)}
+        result['req_per_s'] = throughput(url, seconds, concurrency or workers)
+        return result
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="memory and throughput of the gunicorn deployment per worker count")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--concurrency", type=int, default=0, help="client threads, defaults to the worker count")
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'preload':>7} {'rss MB':>8} {'pss MB':>8} {'uss MB':>8} {'req/s':>8}")
+    for workers in args.workers:
+        for preload in (False, True):
+            r = measure(workers, preload, args.seconds, args.concurrency)
+            print(f"{r['workers']:>7} {str(r['preload']):>7} {r['rss_mb']:8.1f} {r['pss_mb']:8.1f} "
+                  f"{r['uss_mb']:8.1f} {r['req_per_s']:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,9 @@
 import dash_bootstrap_components as dbc
 from dash import dcc, html
-from utils.presets import COMPARISON_DIV_LAYOUT, DAYTYPE_COLORS, COMPARISON_UNIT_WIDTH
-import plotly.express as px
+from utils.presets import COMPARISON_DIV_LAYOUT, COMPARISON_UNIT_WIDTH, FIGURE_CACHE
+from utils.cache import TieredCache
+from utils.comparison import pairwise
+from utils.figures import daytype_figure, frame_figure, matrix_figure
 
 def make_comparison_div():
     return dbc.Col(
@@ -14,25 +16,64 @@ def make_comparison_div():
         id="comparison-div-parent"
     )
 
-def make_comparison_unit(ridership_df, min_date, max_date, modes, n):
-    df = (
-        ridership_df.loc[
-            (min_date <= ridership_df['date']) & (ridership_df['date'] <= max_date),
-        ].assign(weekday = lambda x: x['day_type'] == "W")
-    )
-    main_top = px.line(df, x='date', y=modes)
-    main_top.update_layout(**COMPARISON_DIV_LAYOUT)
+def get_window_df(ridership_store, min_date, max_date, modes):
+    return ridership_store.window(min_date, max_date, modes)
+
+
+def build_comparison_top(ridership_store, min_date, max_date, modes):
+    df = get_window_df(ridership_store, min_date, max_date, modes)
+    main_top = frame_figure(df, modes, 'comparison', line={'width' : 1})
     #main_top.update_layout(margin=dict(b=10, t=10))
-    main_top.update_traces(line={'width' : 1})
-
-    main_bot = px.line(
-                df, x='date', y=modes,
-                color_discrete_sequence=DAYTYPE_COLORS[:len(modes)],
-                facet_col="weekday"
-            )
-    main_bot.update_layout(**COMPARISON_DIV_LAYOUT)
+    return main_top
+
+
+def build_comparison_bot(ridership_store, min_date, max_date, modes):
+    split = ridership_store.split_daytypes(min_date, max_date, modes, 'D', 'mean')
+    main_bot = daytype_figure(split, modes, 'comparison')
     main_bot.update_layout(margin=dict(t=20, b=0))
     main_bot.update_xaxes(showticklabels=False, title=None)
+    return main_bot
+
+
+def build_close_comparison_top(ridership_store, min_date, max_date, modes):
+    df = get_window_df(ridership_store, min_date, max_date, modes)
+    top = frame_figure(df, modes, 'close-comparison', line={'width' : 1})
+    #main_top.update_layout(**COMPARISON_DIV_LAYOUT)
+    #main_top.update_layout(margin=dict(b=10, t=10))
+    return top
+
+
+def build_close_comparison_bot(ridership_store, min_date, max_date, modes):
+    split = ridership_store.split_daytypes(min_date, max_date, modes, 'D', 'mean')
+    bot = daytype_figure(split, modes, 'close-comparison')
+
+    #main_bot.update_layout(**COMPARISON_DIV_LAYOUT)
+    #main_bot.update_layout(margin=dict(t=20, b=0))
+    #main_bot.update_xaxes(showticklabels=False, title=None)
+    return bot
+
+
+FIGURE_BUILDERS = {
+    'comparison-top': build_comparison_top,
+    'comparison-bot': build_comparison_bot,
+    'close-comparison-top': build_close_comparison_top,
+    'close-comparison-bot': build_close_comparison_bot
+}
+
+figure_cache = TieredCache(**FIGURE_CACHE)
+
+
+def get_figure(ridership_store, min_date, max_date, modes, kind):
+    key = (str(min_date), str(max_date), tuple(modes), kind)
+    return figure_cache.get_or_compute(
+        key,
+        lambda: FIGURE_BUILDERS[kind](ridership_store, min_date, max_date, modes)
+    )
+
+
+def make_comparison_unit(ridership_store, min_date, max_date, modes, n):
+    main_top = get_figure(ridership_store, min_date, max_date, modes, 'comparison-top')
+    main_bot = get_figure(ridership_store, min_date, max_date, modes, 'comparison-bot')
     layout = dbc.Col([
         dbc.Row([
             dbc.Col(
@@ -64,34 +105,15 @@ def make_close_comparison_div():
             dbc.Col(default_container, width=6, id='close-comparison-unit-left'),
             dbc.Col(default_container, width=6, id='close-comparison-unit-right')
         ]),
-        dbc.Row(default_container, id='close-comparison-bot')
+        dbc.Row(matrix_container, id='close-comparison-bot')
     ])
 
     return layout
 
 
-def make_close_comparison_unit(ridership_df, min_date, max_date, modes, n):
-    df = (
-        ridership_df.loc[
-            (min_date <= ridership_df['date']) & (ridership_df['date'] <= max_date),
-        ].assign(weekday = lambda x: x['day_type'] == "W")
-    )
-    top = px.line(df, x='date', y=modes)
-    #main_top.update_layout(**COMPARISON_DIV_LAYOUT)
-    #main_top.update_layout(margin=dict(b=10, t=10))
-    top.update_layout(margin=COMPARISON_DIV_LAYOUT['margin'])
-    top.update_traces(line={'width' : 1})
-
-    bot = px.line(
-                df, x='date', y=modes,
-                color_discrete_sequence=DAYTYPE_COLORS[:len(modes)],
-                facet_col="weekday"
-            )
-    
-    bot.update_layout(margin=COMPARISON_DIV_LAYOUT['margin'])
-    #main_bot.update_layout(**COMPARISON_DIV_LAYOUT)
-    #main_bot.update_layout(margin=dict(t=20, b=0))
-    #main_bot.update_xaxes(showticklabels=False, title=None)
+def make_close_comparison_unit(ridership_store, min_date, max_date, modes, n):
+    top = get_figure(ridership_store, min_date, max_date, modes, 'close-comparison-top')
+    bot = get_figure(ridership_store, min_date, max_date, modes, 'close-comparison-bot')
     layout = dbc.Col([
         dbc.Row(
             dbc.Col(html.Div(f"{min_date} to {max_date}"), width="auto"),
@@ -112,4 +134,16 @@ def make_close_comparison_unit(ridership_df, min_date, max_date, modes, n):
     return layout
 
 
-default_container = dbc.Container("please, check graphs to compare.", class_name="default-container")
\ No newline at end of file
+def make_comparison_matrix(matrix, units):
+    if matrix is None or len(units) < 2:
+        return matrix_container
+    labels = [f"{unit['index']}: {unit['min_date']} to {unit['max_date']}" for unit in units]
+    names = [str(unit['index']) for unit in units]
+    return dcc.Graph(
+        figure=matrix_figure(pairwise(matrix), labels, names),
+        config={'displayModeBar': False}
+    )
+
+
+default_container = dbc.Container("please, check graphs to compare.", class_name="default-container")
+matrix_container = dbc.Container("save two timeframes or more to compare them all.", class_name="default-container")
\ No newline at end of file
@@ -1,5 +1,6 @@
 from dash import html, dcc
 import dash_bootstrap_components as dbc
+from utils.presets import AGGREGATION_OPTIONS, OVERLAYS, RESOLUTION_OPTIONS
 
 def make_table_header():
     table_header = [
@@ -7,7 +8,8 @@ def make_table_header():
             html.Th(""),
             html.Th("transportation modes"),
             html.Th("date resolution"),
-            html.Th("aggregation method")
+            html.Th("aggregation method"),
+            html.Th("overlay")
         ]))
     ]
     return table_header
@@ -27,22 +29,21 @@ def make_table_body():
             )),
             html.Td(dcc.RadioItems(
                 id="resolution1",
-                options={
-                    'D' : 'D',
-                    'W' : 'W',
-                    'M' : 'M'
-                },
+                options={resolution : resolution for resolution in RESOLUTION_OPTIONS['main']},
                 value='W',
                 inline=True
             )),
             html.Td(dcc.RadioItems(
                 id="aggregation1",
-                options={
-                    'mean' : 'mean',
-                    'sum' : 'sum'
-                },
+                options={aggregation : aggregation for aggregation in AGGREGATION_OPTIONS},
                 value='mean',
                 inline=True
+            )),
+            html.Td(dcc.Checklist(
+                id="overlay1",
+                options=OVERLAYS,
+                value=[],
+                inline=True
             ))
         ]),
         html.Tr([
@@ -66,24 +67,40 @@ def make_table_body():
             )),
             html.Td(dcc.RadioItems(
                 id="resolution2",
-                options=[
-                    {'label' : 'D', 'value' : 'D'},
-                    {'label' : 'W', 'value' : 'W'},
-                    {'label' : 'M', 'value' : 'M'}
-                ],
+                options=[{'label' : resolution, 'value' : resolution} for resolution in RESOLUTION_OPTIONS['zoomed']],
                 value='W',
                 inline=True
             )),
             html.Td(dcc.RadioItems(
                 id="aggregation2",
-                options=[
-                    {'label' : 'mean', 'value' : 'mean'},
-                    {'label' : 'sum', 'value' : 'sum'}
-                ],
+                options=[{'label' : aggregation, 'value' : aggregation} for aggregation in AGGREGATION_OPTIONS],
                 value='mean',
                 inline=True
+            )),
+            html.Td(dcc.Checklist(
+                id="overlay2",
+                options=OVERLAYS,
+                value=[],
+                inline=True
             ))
-        ], id="select-row", style={'display' : 'none'})
+        ], id="select-row", style={'display' : 'none'}),
+        html.Tr([
+            html.Td("by day type"),
+            html.Td("same as selection"),
+            html.Td(dcc.RadioItems(
+                id="resolution3",
+                options=[{'label' : resolution, 'value' : resolution} for resolution in RESOLUTION_OPTIONS['daytype']],
+                value='D',
+                inline=True
+            )),
+            html.Td(dcc.RadioItems(
+                id="aggregation3",
+                options=[{'label' : aggregation, 'value' : aggregation} for aggregation in AGGREGATION_OPTIONS],
+                value='mean',
+                inline=True
+            )),
+            html.Td("")
+        ], id="daytype-row", style={'display' : 'none'})
     ])]
     return table_body
 
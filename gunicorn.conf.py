@@ -0,0 +1,23 @@
+import gc
+import multiprocessing
+import os
+
+wsgi_app = "wsgi:server"
+bind = os.environ.get("CITY_BIND", "127.0.0.1:8050")
+workers = int(os.environ.get("CITY_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("CITY_THREADS", 1))
+preload_app = os.environ.get("CITY_PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    # everything the preloaded app allocated (dataset, cube, layout) moves to
+    # the permanent generation, so the collector never writes to those pages
+    # in a worker and they stay shared after the fork
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.load_dataset()
+    app.start_watcher()
+    app.start_warmup()
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.store import RidershipStore
+from utils.utils import get_df
+
+# the resample fallback still uses the 'M', 'Q' and 'Y' aliases
+pytestmark = pytest.mark.filterwarnings("ignore:'[MQY]' is deprecated:FutureWarning")
+
+
+@pytest.fixture(scope="module")
+def data():
+    # a bit over two years with a few gaps: a missing week, a missing month
+    # end and a missing quarter start
+    dates = pd.date_range('2019-11-13', '2022-02-09')
+    dates = dates[~dates.isin(
+        pd.date_range('2020-03-02', '2020-03-08').union(pd.date_range('2020-06-28', '2020-06-30'))
+        .union(pd.date_range('2021-01-01', '2021-01-03'))
+    )]
+    rng = np.random.default_rng(1)
+    return pd.DataFrame({
+        'date': dates,
+        'day_type': np.where(dates.dayofweek < 5, 'W', 'U'),
+        'bus': rng.integers(0, 1_000_000, len(dates)),
+        'rail': rng.integers(0, 1_000_000, len(dates))
+    })
+
+
+@pytest.fixture(scope="module")
+def store(data):
+    return RidershipStore(data)
+
+
+WINDOWS = [
+    ('2019-11-13', '2022-02-09'),  # everything
+    ('2020-02-12', '2021-05-20'),  # partial first and last periods
+    ('2020-06-29', '2020-07-02'),  # starts in a gap
+    ('2020-03-04', '2020-03-04'),  # one day, missing
+    ('2021-07-15', '2021-07-15'),  # one day
+    ('2018-01-01', '2019-11-20'),  # starts before the data
+    ('2022-02-01', '2023-01-01'),  # ends after the data
+    ('2015-01-01', '2016-01-01')   # outside the data
+]
+
+
+@pytest.mark.parametrize("min_date, max_date", WINDOWS)
+@pytest.mark.parametrize("resolution", ['D', 'W', 'M', 'Q', 'Y'])
+@pytest.mark.parametrize("aggregation", ['mean', 'sum'])
+def test_store_matches_resample(data, store, min_date, max_date, resolution, aggregation):
+    modes = ['bus', 'rail', 'total']
+    expected = get_df(data, min_date, max_date, modes, resolution, aggregation)
+    result = get_df(store, min_date, max_date, modes, resolution, aggregation)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_index_type=False)
@@ -0,0 +1,64 @@
+import gzip
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from utils.api import RidershipAPI
+from utils.store import DatasetHandle, RidershipStore
+
+CLEAN = """date,day_type,bus,rail,total
+2024-01-01,U,100,50,150
+2024-01-02,W,200,120,320
+2024-01-03,W,210,130,340
+"""
+
+
+@pytest.fixture
+def client(tmp_path):
+    path = tmp_path / "clean.csv"
+    path.write_text(CLEAN)
+    app = SimpleNamespace(server=Flask(__name__))
+    RidershipAPI(app, DatasetHandle(RidershipStore.from_csv(str(path))))
+    return app.server.test_client()
+
+
+def test_unchanged_query_is_not_modified(client):
+    response = client.get("/api/ridership?modes=bus")
+    assert response.status_code == 200
+    repeat = client.get("/api/ridership?modes=bus", headers={'If-None-Match': response.headers['ETag']})
+    assert repeat.status_code == 304
+    assert repeat.data == b""
+
+
+def test_gzip_body_matches_the_plain_one(client):
+    plain = client.get("/api/ridership?resolution=W&aggregation=sum")
+    packed = client.get("/api/ridership?resolution=W&aggregation=sum", headers={'Accept-Encoding': 'gzip'})
+    assert packed.headers['Content-Encoding'] == 'gzip'
+    assert packed.headers['ETag'] != plain.headers['ETag']
+    assert gzip.decompress(packed.data) == plain.data
+
+
+@pytest.mark.parametrize("query", [
+    "modes=bus,tram",
+    "resolution=H",
+    "aggregation=median",
+    "from=yesterday",
+    "from=2024-01-03&to=2024-01-01",
+    "format=xml"
+])
+def test_bad_queries_are_rejected(client, query):
+    assert client.get(f"/api/ridership?{query}").status_code == 400
+
+
+def test_dates_are_clamped_to_the_data(client):
+    whole = client.get("/api/ridership?modes=bus")
+    assert client.get("/api/ridership?modes=bus&from=1500-01-01&to=2300-01-01").data == whole.data
+    assert whole.data.decode().splitlines() == ["date,bus", "2024-01-01,100.0", "2024-01-02,200.0", "2024-01-03,210.0"]
+
+
+@pytest.mark.parametrize("query", ["from=1500-01-01&to=1600-01-01", "from=2300-01-01&to=2400-01-01"])
+def test_window_outside_the_data_is_empty(client, query):
+    response = client.get(f"/api/ridership?modes=bus&{query}")
+    assert response.status_code == 200
+    assert response.data.decode().splitlines() == ["date,bus"]
@@ -0,0 +1,105 @@
+import os
+
+import pandas as pd
+import pytest
+
+from utils.ingest import DatasetWatcher, IngestError, ingest_file, new_rows, read_raw, validate
+from utils.store import DatasetHandle, RidershipStore
+
+CLEAN = """date,day_type,bus,rail,total
+2024-01-01,U,100,50,150
+2024-01-02,W,200,120,320
+2024-01-03,W,210,130,340
+"""
+
+RAW_HEADER = "service_date,day_type,bus,rail_boardings,total_rides\n"
+
+
+def raw_rows(*lines):
+    return pd.DataFrame(
+        [dict(zip(['date', 'day_type', 'bus', 'rail', 'total'], line)) for line in lines]
+    ).astype({'date': 'datetime64[ns]'})
+
+
+@pytest.fixture
+def clean_csv(tmp_path):
+    path = tmp_path / "clean.csv"
+    path.write_text(CLEAN)
+    return str(path)
+
+
+def test_validate_accepts_well_formed_days():
+    validate(raw_rows(('2024-01-04', 'W', 1, 2, 3), ('2024-01-05', 'A', 4, 5, 9)))
+
+
+@pytest.mark.parametrize("rows, problem", [
+    (raw_rows(('2024-01-04', 'W', 1, 2, 3), ('2024-01-04', 'W', 1, 2, 4)), "conflicting rows"),
+    (raw_rows(('2024-01-04', 'W', 1, 2, 4)), "total_rides"),
+    (raw_rows(('2024-01-04', 'W', 1.5, 2, 3.5)), "non integer"),
+    (raw_rows(('2024-01-04', 'W', -1, 2, 1)), "negative"),
+    (raw_rows(('2024-01-04', 'X', 1, 2, 3)), "day_type"),
+])
+def test_validate_rejects(rows, problem):
+    with pytest.raises(IngestError, match=problem):
+        validate(rows)
+
+
+def test_new_rows_skips_stored_days_and_exact_duplicates():
+    raw = raw_rows(
+        ('2024-01-03', 'W', 999, 1, 1000),
+        ('2024-01-05', 'A', 4, 5, 9),
+        ('2024-01-04', 'W', 1, 2, 3),
+        ('2024-01-04', 'W', 1, 2, 3)
+    )
+    rows = new_rows(raw, after=pd.Timestamp('2024-01-03'))
+    assert rows['date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-04', '2024-01-05']
+
+
+def test_ingest_matches_a_fresh_load(clean_csv, tmp_path):
+    incoming = tmp_path / "incoming"
+    incoming.mkdir()
+    (incoming / "good.csv").write_text(
+        RAW_HEADER + "01/03/2024,W,210,130,340\n01/04/2024,W,220,140,360\n01/05/2024,A,150,90,240\n"
+    )
+    (incoming / "bad.csv").write_text(RAW_HEADER + "01/06/2024,U,100,50,151\n")
+
+    handle = DatasetHandle(RidershipStore.from_csv(clean_csv))
+    watcher = DatasetWatcher(handle, RidershipStore.from_csv, clean_csv, incoming_dir=str(incoming))
+    watcher.poll()
+
+    assert sorted(os.listdir(incoming / "processed")) == ["good.csv"]
+    assert sorted(os.listdir(incoming / "rejected")) == ["bad.csv"]
+    assert len(handle.current()) == 5
+
+    fresh = RidershipStore.from_csv(clean_csv)
+    assert handle.version == fresh.version
+    pd.testing.assert_frame_equal(handle.current().data, fresh.data)
+    # the clean CSV got the two new days appended, once
+    assert pd.read_csv(clean_csv)['date'].tolist() == ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05']
+
+
+def test_workers_ingest_onto_the_current_csv(clean_csv, tmp_path):
+    # two workers, each with its own store of the same clean CSV
+    first = DatasetHandle(RidershipStore.from_csv(clean_csv))
+    second = DatasetHandle(RidershipStore.from_csv(clean_csv))
+    d1 = tmp_path / "d1.csv"
+    d1.write_text(RAW_HEADER + "01/04/2024,W,220,140,360\n")
+    d2 = tmp_path / "d2.csv"
+    d2.write_text(RAW_HEADER + "01/04/2024,W,220,140,360\n01/05/2024,A,150,90,240\n")
+
+    assert ingest_file(str(d1), first, RidershipStore.from_csv, clean_csv) == 1
+    # the second worker has not seen 01/04 yet, it must not add it again
+    assert ingest_file(str(d2), second, RidershipStore.from_csv, clean_csv) == 1
+
+    dates = pd.read_csv(clean_csv)['date'].tolist()
+    assert dates == ['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05']
+    fresh = RidershipStore.from_csv(clean_csv)
+    assert second.version == fresh.version
+    pd.testing.assert_frame_equal(second.current().data, fresh.data)
+
+
+def test_read_raw_requires_the_raw_columns(tmp_path):
+    path = tmp_path / "raw.csv"
+    path.write_text("service_date,day_type,bus\n01/04/2024,W,1\n")
+    with pytest.raises(IngestError, match="missing columns"):
+        read_raw(str(path))
@@ -0,0 +1,29 @@
+import numpy as np
+
+from utils.stations import StationStore, build_partitions
+
+ENTRIES = """station_id,stationname,date,daytype,rides
+1,Alpha,01/01/2024,U,100
+2,Beta,01/01/2024,U,200
+1,Alpha,01/02/2024,W,1000
+2,Beta,01/02/2024,W,2000
+1,Alpha,01/02/2024,W,1000
+2,Beta,01/03/2024,W,2900
+"""
+
+
+def test_duplicates_across_chunks_count_once(tmp_path):
+    raw = tmp_path / "entries.csv"
+    raw.write_text(ENTRIES)
+    root = str(tmp_path / "stations")
+    # two rows per chunk: the repeated 1/2 day of station 1 lands in another chunk
+    catalog = build_partitions(str(raw), root, station_lines={1: ['Red'], 2: ['Red']}, chunksize=2)
+
+    stations = StationStore(root)
+    subset = stations.store(stations=[1, 2]).data
+    system = stations.store().data
+    line = stations.store(line='Red').data
+    assert subset['rail'].tolist() == [300, 3000, 2900]
+    assert np.array_equal(system['rail'], subset['rail'])
+    assert np.array_equal(line['rail'], subset['rail'])
+    assert catalog['stations']['1']['rides_per_year'] == {'2024': 1100}
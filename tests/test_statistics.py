@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.store import RidershipStore
+
+
+@pytest.fixture(scope="module")
+def store():
+    dates = pd.date_range('2019-12-01', '2021-03-31')
+    return RidershipStore(pd.DataFrame({
+        'date': dates,
+        'day_type': np.where(dates.dayofweek < 5, 'W', 'U'),
+        'bus': np.arange(len(dates)) + 100,
+        'rail': np.arange(len(dates)) * 2
+    }))
+
+
+def test_previous_year_skips_the_leap_day(store):
+    df = store.year_over_year('2021-02-26', '2021-03-02', ['bus'], 'D', 'sum')
+    assert df['date'].dt.strftime('%m-%d').tolist() == ['02-26', '02-27', '02-28', '03-01', '03-02']
+    day = store.aggregate('2020-02-28', '2020-02-28', ['bus'], 'D', 'sum')['bus'].iloc[0]
+    assert df['bus'].iloc[2] == day
+
+
+@pytest.mark.parametrize("resolution", ['W', 'M', 'Q'])
+@pytest.mark.parametrize("aggregation", ['mean', 'sum'])
+def test_previous_year_lands_on_the_current_periods(store, resolution, aggregation):
+    current = store.aggregate('2021-01-06', '2021-03-31', ['bus', 'total'], resolution, aggregation)
+    previous = store.year_over_year('2021-01-06', '2021-03-31', ['bus', 'total'], resolution, aggregation)
+    assert previous['date'].tolist() == current['date'].tolist()
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from utils.dataset import has_mode, mode_values
+
+# pandas period aliases for every resolution the cube can serve; the labels
+# they produce match what `resample` gives for the same rule ('W' ends on
+# sunday, 'M'/'Q'/'Y' on the last day of the period).
+PERIOD_ALIASES = {
+    'D': 'D',
+    'W': 'W',
+    'M': 'M',
+    'Q': 'Q',
+    'Y': 'Y'
+}
+
+
+class AggregationCube:
+    """Prefix sums and counts of every mode over the sorted daily rows, plus
+    the calendar period layout of each resolution, so that a mean or sum over
+    any date window is a couple of binary searches and a slice."""
+
+    def __init__(self, data, modes=('bus', 'rail', 'total'), resolutions=PERIOD_ALIASES):
+        data = data.sort_values('date')
+        self.dates = data['date'].to_numpy(dtype='datetime64[ns]')
+        self.modes = [mode for mode in modes if has_mode(data, mode)]
+
+        self.sums = {}
+        self.counts = {}
+        for mode in self.modes:
+            values = mode_values(data, mode)
+            present = ~pd.isna(values)
+            if np.issubdtype(values.dtype, np.integer):
+                values = values.astype(np.int64)
+            else:
+                values = np.where(present, values, 0).astype(np.float64)
+            self.sums[mode] = np.concatenate([[0], np.cumsum(values)])
+            # day counts fit int32 for any realistic history
+            self.counts[mode] = np.concatenate([np.zeros(1, np.int32), np.cumsum(present, dtype=np.int32)])
+
+        self.levels = {}
+        for resolution, alias in resolutions.items():
+            self.levels[resolution] = self._build_level(alias)
+
+    def _build_level(self, alias):
+        day_periods = pd.DatetimeIndex(self.dates).to_period(alias)
+        first, last = day_periods.min(), day_periods.max()
+        periods = pd.period_range(first, last, freq=alias)
+
+        # every calendar period between the first and the last day gets a
+        # slot, empty ones included, just like resample does
+        period_of = (day_periods.asi8 - first.ordinal).astype(np.int32)
+        sizes = np.bincount(period_of, minlength=len(periods))
+        starts = np.concatenate([[0], np.cumsum(sizes)])
+        labels = periods.end_time.normalize().to_numpy(dtype='datetime64[ns]')
+
+        return {'period_of': period_of, 'starts': starts, 'labels': labels}
+
+    def bounds(self, min_date, max_date):
+        lo = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(min_date), 'ns'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(max_date), 'ns'), side='right')
+        return lo, hi
+
+    def _edges(self, lo, hi, resolution):
+        # cut points of the selection: interior period boundaries plus the
+        # selection edges, so partial periods only cover the selected days
+        level = self.levels[resolution]
+        first = level['period_of'][lo]
+        last = level['period_of'][hi - 1]
+        return np.concatenate([[lo], level['starts'][first + 1:last + 1], [hi]])
+
+    def days(self, lo, hi, mode, resolution):
+        """Days with a `mode` value in every period of the rows [lo, hi),
+        selected days only, in the order of `aggregate`."""
+        if hi <= lo:
+            return np.array([], dtype=np.int32)
+        return np.diff(self.counts[mode][self._edges(lo, hi, resolution)])
+
+    def aggregate(self, lo, hi, modes, resolution, aggregation_method):
+        if hi <= lo:
+            return pd.DataFrame({'date': np.array([], dtype='datetime64[ns]'),
+                                 **{mode: [] for mode in modes}})
+
+        level = self.levels[resolution]
+        first = level['period_of'][lo]
+        last = level['period_of'][hi - 1]
+        edges = self._edges(lo, hi, resolution)
+        df = pd.DataFrame({'date': level['labels'][first:last + 1]})
+        for mode in modes:
+            sums = np.diff(self.sums[mode][edges])
+            if aggregation_method == "mean":
+                counts = np.diff(self.counts[mode][edges])
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    df[mode] = sums / counts
+            elif aggregation_method == "sum":
+                df[mode] = sums
+
+        return df
+
+    def periods(self, lo, hi, resolution):
+        """Number of points `aggregate` gives for the rows [lo, hi) at
+        `resolution`, without aggregating."""
+        if hi <= lo:
+            return 0
+        period_of = self.levels[resolution]['period_of']
+        return int(period_of[hi - 1] - period_of[lo]) + 1
+
+    def query(self, min_date, max_date, modes, resolution, aggregation_method):
+        lo, hi = self.bounds(min_date, max_date)
+        return self.aggregate(lo, hi, modes, resolution, aggregation_method)
@@ -0,0 +1,186 @@
+import hashlib
+import importlib.util
+import zlib
+
+import pandas as pd
+from flask import Response, request
+
+from utils.utils import get_df
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# pyarrow is slow to import, it is only loaded by the first arrow request
+ARROW = importlib.util.find_spec("pyarrow") is not None
+
+RESOLUTIONS = ['D', 'W', 'M', 'Q', 'Y']
+AGGREGATIONS = ['mean', 'sum']
+MODES = ['bus', 'rail', 'total']
+
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def parse_query(args, store):
+    """The normalized query of an /api/ridership request; dates default to
+    the whole dataset, modes to all of them."""
+    first, last = pd.Timestamp(store.dates[0]), pd.Timestamp(store.dates[-1])
+    try:
+        min_date = pd.Timestamp(args.get('from') or first).normalize()
+        max_date = pd.Timestamp(args.get('to') or last).normalize()
+    except ValueError as e:
+        raise BadRequest(f"invalid date: {e}")
+    if min_date > max_date:
+        raise BadRequest("from must not be after to")
+    # dates are clamped to the data, which keeps them within datetime64[ns];
+    # a window wholly outside the data ends up one day past its edge, empty
+    min_date = min(max(min_date, first), last + pd.Timedelta(days=1))
+    max_date = max(min(max_date, last), first - pd.Timedelta(days=1))
+    modes = [mode for mode in args.get('modes', ','.join(MODES)).split(',') if mode]
+    resolution = args.get('resolution', 'D')
+    aggregation = args.get('aggregation', 'mean')
+    if not modes or any(mode not in MODES for mode in modes):
+        raise BadRequest(f"modes must be a comma separated subset of {','.join(MODES)}")
+    if resolution not in RESOLUTIONS:
+        raise BadRequest(f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    if aggregation not in AGGREGATIONS:
+        raise BadRequest(f"aggregation must be one of {', '.join(AGGREGATIONS)}")
+    return {
+        'from': min_date.strftime('%Y-%m-%d'), 'to': max_date.strftime('%Y-%m-%d'),
+        'modes': modes, 'resolution': resolution, 'aggregation': aggregation
+    }
+
+
+def csv_chunks(df, chunk_rows):
+    yield ','.join(df.columns) + '\n'
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(header=False, index=False, date_format='%Y-%m-%d')
+
+
+class _Sink:
+    # file object pyarrow writes the stream into; the generator drains it
+    # after every batch
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def arrow_chunks(df, chunk_rows):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = _Sink()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        yield sink.drain()
+        for batch in table.to_batches(max_chunksize=chunk_rows):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def compressed(chunks, encoding):
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            yield compressor.compress(chunk)
+        yield compressor.flush()
+    elif encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            yield compressor.process(chunk)
+        yield compressor.finish()
+    else:
+        yield from chunks
+
+
+def choose_encoding(accept_encoding):
+    offered = {
+        value.split(';')[0].strip().lower()
+        for value in accept_encoding.split(',')
+        if not value.strip().endswith(';q=0')
+    }
+    if brotli is not None and 'br' in offered:
+        return 'br'
+    if 'gzip' in offered:
+        return 'gzip'
+    return None
+
+
+class RidershipAPI:
+    """Serves the aggregated ridership at /api/ridership, backed by `get_df`:
+
+        /api/ridership?from=2019-01-01&to=2019-12-31&modes=bus,rail&resolution=M&aggregation=mean
+
+    The body is streamed in chunks of `chunk_rows` rows as CSV, or as an
+    Arrow IPC stream with format=arrow (or an Accept header asking for it)
+    when pyarrow is installed, and compressed with brotli or gzip on the
+    fly as the client accepts. The ETag is derived from the dataset version
+    and the query, so a repeat pull of an unchanged dataset is a 304 that
+    never touches the data."""
+
+    def __init__(self, app, dataset, chunk_rows=2000):
+        self.dataset = dataset
+        self.chunk_rows = chunk_rows
+        app.server.add_url_rule("/api/ridership", "ridership_api", self.view)
+
+    def view(self):
+        store = self.dataset.current()
+        try:
+            query = parse_query(request.args, store)
+        except BadRequest as e:
+            return Response(f"{e}\n", status=400, mimetype="text/plain")
+
+        fmt = request.args.get('format')
+        if fmt is None:
+            fmt = 'arrow' if ARROW_MIMETYPE in request.headers.get('Accept', '') else 'csv'
+        if fmt not in ('csv', 'arrow'):
+            return Response("format must be csv or arrow\n", status=400, mimetype="text/plain")
+        if fmt == 'arrow' and not ARROW:
+            return Response("arrow output needs pyarrow on the server\n", status=406, mimetype="text/plain")
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        key = f"{store.version}|{fmt}|{query['from']}|{query['to']}|{','.join(query['modes'])}" \
+              f"|{query['resolution']}|{query['aggregation']}"
+        etag = hashlib.sha1(key.encode()).hexdigest()
+        # the compressed bodies are different representations of the same
+        # data, each gets its own tag
+        tag = f"{etag}-{encoding}" if encoding else etag
+        headers = {
+            'ETag': f'"{tag}"',
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept, Accept-Encoding',
+            'X-Dataset-Version': str(store.version)
+        }
+
+        if tag in [t.strip().removeprefix('W/').strip('"') for t in request.headers.get('If-None-Match', '').split(',')]:
+            return Response(status=304, headers=headers)
+
+        df = get_df(store, query['from'], query['to'], query['modes'], query['resolution'], query['aggregation'])
+        if fmt == 'arrow':
+            chunks = arrow_chunks(df, self.chunk_rows)
+            mimetype = ARROW_MIMETYPE
+        else:
+            chunks = (chunk.encode() for chunk in csv_chunks(df, self.chunk_rows))
+            mimetype = "text/csv"
+            headers['Content-Disposition'] = 'inline; filename="ridership.csv"'
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(compressed(chunks, encoding), mimetype=mimetype, headers=headers)
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import pickle
+import shutil
+import threading
+from collections import OrderedDict
+
+
+class TieredCache:
+    """Two tier result cache: an in-memory LRU in front of an optional
+    pickle-per-entry directory that survives restarts. Both tiers evict the
+    least recently used entries once their byte budget is exceeded, and all
+    entries belong to one dataset version."""
+
+    def __init__(self, max_memory_bytes=64 << 20, disk_dir=None, max_disk_bytes=256 << 20, version=None):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir
+        self.version = None
+
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self.stats = {
+            'memory_hits': 0, 'memory_misses': 0,
+            'disk_hits': 0, 'disk_misses': 0,
+            'memory_evictions': 0, 'disk_evictions': 0
+        }
+        self.set_version(version)
+        # a forked child (a background callback job) inherits the lock in
+        # whatever state another thread of the parent, e.g. the view warm-up,
+        # left it in; it starts with a free one instead
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_lock)
+
+    def _reset_lock(self):
+        self._lock = threading.RLock()
+
+    def _uses_disk(self):
+        # entries only go to disk once they can be tied to a dataset version
+        return self.disk_dir is not None and self.version is not None
+
+    def _version_dir(self):
+        return os.path.join(self.disk_dir, str(self.version))
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self._version_dir(), f"{name}.pkl")
+
+    def set_version(self, version):
+        """Drops every entry computed for another dataset version."""
+        with self._lock:
+            if version == self.version and self.version is not None:
+                return
+            self.version = version
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._disk.clear()
+            self._disk_bytes = 0
+            if not self._uses_disk():
+                return
+
+            os.makedirs(self._version_dir(), exist_ok=True)
+            for entry in os.listdir(self.disk_dir):
+                if entry != str(version):
+                    shutil.rmtree(os.path.join(self.disk_dir, entry), ignore_errors=True)
+
+            # pick up what an earlier process left behind, oldest first
+            entries = []
+            for entry in os.scandir(self._version_dir()):
+                if entry.name.endswith('.pkl'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+            for _, path, size in sorted(entries):
+                self._disk[path] = size
+                self._disk_bytes += size
+            self._evict_disk()
+
+    def _evict_memory(self):
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, (_, size) = self._memory.popitem(last=False)
+            self._memory_bytes -= size
+            self.stats['memory_evictions'] += 1
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            path, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.stats['disk_evictions'] += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _remember(self, key, value, size):
+        if key in self._memory:
+            self._memory_bytes -= self._memory.pop(key)[1]
+        self._memory[key] = (value, size)
+        self._memory_bytes += size
+        self._evict_memory()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return self._memory[key][0]
+            self.stats['memory_misses'] += 1
+
+            if not self._uses_disk():
+                return default
+            path = self._path(key)
+            # another worker may have written the entry since we scanned
+            if path not in self._disk and not os.path.isfile(path):
+                self.stats['disk_misses'] += 1
+                return default
+            try:
+                with open(path, 'rb') as f:
+                    payload = f.read()
+                value = pickle.loads(payload)
+                os.utime(path)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                self._disk_bytes -= self._disk.pop(path, 0)
+                self.stats['disk_misses'] += 1
+                return default
+
+            if path not in self._disk:
+                self._disk[path] = len(payload)
+                self._disk_bytes += len(payload)
+            self._disk.move_to_end(path)
+            self.stats['disk_hits'] += 1
+            self._remember(key, value, len(payload))
+            return value
+
+    def set(self, key, value):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, value, len(payload))
+            if not self._uses_disk():
+                return
+
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except OSError:
+                return
+            if path in self._disk:
+                self._disk_bytes -= self._disk.pop(path)
+            self._disk[path] = len(payload)
+            self._disk_bytes += len(payload)
+            self._evict_disk()
+
+    def get_or_compute(self, key, compute):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            version = self.version
+            if self._uses_disk():
+                shutil.rmtree(self._version_dir(), ignore_errors=True)
+            self.version = None
+            self.set_version(version)
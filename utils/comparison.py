@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+from utils.dataset import mode_values
+
+# days of the trailing mean the drawdown is measured on; a whole week so the
+# weekend dips do not count as drawdowns
+DRAWDOWN_WINDOW = 7
+
+
+def align(ridership_store, units):
+    """The daily ridership (the sum of each unit's modes) of every saved
+    timeframe as one row of an N x L matrix. Column 0 is the monday of the
+    week a timeframe starts in and every day sits at its offset from it, so
+    the same column is the same weekday in every row; days outside a
+    timeframe are NaN. Also returns the matching weekday mask."""
+    rows = []
+    for unit in units:
+        lo, hi = ridership_store.bounds(unit['min_date'], unit['max_date'])
+        dates = ridership_store.dates[lo:hi].astype('datetime64[D]')
+        if len(dates) == 0:
+            rows.append((np.array([], dtype=np.int64), np.array([]), np.array([], dtype=bool)))
+            continue
+        # numpy weeks start on thursday 1970-01-01, so monday is day 4
+        monday = dates[0] - (dates[0].astype(np.int64) - 4) % 7
+        offsets = (dates - monday).astype(np.int64)
+        data = ridership_store.data.iloc[lo:hi]
+        values = sum((mode_values(data, mode).astype(np.float64) for mode in unit['modes']), np.zeros(hi - lo))
+        rows.append((offsets, values, (data['day_type'] == 'W').to_numpy()))
+
+    length = max((offsets[-1] + 1 for offsets, _, _ in rows if len(offsets)), default=0)
+    values = np.full((len(units), length), np.nan)
+    weekday = np.zeros((len(units), length), dtype=bool)
+    for i, (offsets, row, is_weekday) in enumerate(rows):
+        values[i, offsets] = row
+        weekday[i, offsets] = is_weekday
+    return values, weekday
+
+
+def unit_metrics(values, weekday):
+    """Mean daily ridership, weekday share of the rides and max drawdown of
+    the trailing weekly mean of every row."""
+    present = ~np.isnan(values)
+    filled = np.where(present, values, 0)
+    totals = filled.sum(axis=1)
+    days = present.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = totals / days
+        weekday_share = np.where(weekday, filled, 0).sum(axis=1) / totals
+
+        sums = np.concatenate([np.zeros((len(values), 1)), np.cumsum(filled, axis=1)], axis=1)
+        counts = np.concatenate([np.zeros((len(values), 1)), np.cumsum(present, axis=1)], axis=1)
+        w = DRAWDOWN_WINDOW
+        weekly = (sums[:, w:] - sums[:, :-w]) / (counts[:, w:] - counts[:, :-w])
+        weekly[(counts[:, w:] - counts[:, :-w]) < w] = np.nan
+        # a drawdown is never positive, missing weeks count as none
+        peak = np.fmax.accumulate(weekly, axis=1)
+        drawdown = np.where(np.isnan(weekly), 0, weekly / peak - 1).min(axis=1, initial=0)
+    return {'mean': mean, 'weekday_share': weekday_share, 'drawdown': drawdown}
+
+
+def correlation(a, b):
+    """Pearson correlation of every row of `a` with every row of `b` over the
+    columns both have values in, as a len(a) x len(b) matrix."""
+    length = max(a.shape[1], b.shape[1])
+    a = np.pad(a, ((0, 0), (0, length - a.shape[1])), constant_values=np.nan)
+    b = np.pad(b, ((0, 0), (0, length - b.shape[1])), constant_values=np.nan)
+    pa, pb = (~np.isnan(a)).astype(np.float64), (~np.isnan(b)).astype(np.float64)
+    xa, xb = np.nan_to_num(a), np.nan_to_num(b)
+
+    n = pa @ pb.T
+    sum_a, sum_b = xa @ pb.T, pa @ xb.T
+    sum_aa, sum_bb = (xa ** 2) @ pb.T, pa @ (xb ** 2).T
+    sum_ab = xa @ xb.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = (n * sum_ab - sum_a * sum_b) / np.sqrt((n * sum_aa - sum_a ** 2) * (n * sum_bb - sum_b ** 2))
+    corr[n < 2] = np.nan
+    return corr
+
+
+def compare(ridership_store, units):
+    """Every metric of all saved timeframes in one batch; JSON friendly so
+    it can live in the session."""
+    values, weekday = align(ridership_store, units)
+    metrics = unit_metrics(values, weekday)
+    return {
+        'version': ridership_store.version,
+        'index': [unit['index'] for unit in units],
+        **{name: to_list(metric) for name, metric in metrics.items()},
+        'correlation': to_list(correlation(values, values))
+    }
+
+
+def add_unit(matrix, ridership_store, units, unit):
+    """`matrix` of `units` extended by `unit`: only its own metrics and its
+    row and column of the correlation are computed."""
+    if matrix is None or matrix['version'] != ridership_store.version \
+            or matrix['index'] != [u['index'] for u in units]:
+        return compare(ridership_store, units + [unit])
+
+    values, weekday = align(ridership_store, units + [unit])
+    new = unit_metrics(values[-1:], weekday[-1:])
+    corr = correlation(values[-1:], values)[0]
+    matrix = dict(matrix)
+    matrix['index'] = matrix['index'] + [unit['index']]
+    for name, metric in new.items():
+        matrix[name] = matrix[name] + to_list(metric)
+    matrix['correlation'] = [
+        row + [c] for row, c in zip(matrix['correlation'], to_list(corr[:-1]))
+    ] + [to_list(corr)]
+    return matrix
+
+
+def remove_unit(matrix, position):
+    matrix = dict(matrix)
+    matrix['index'] = [i for p, i in enumerate(matrix['index']) if p != position]
+    for name in ('mean', 'weekday_share', 'drawdown'):
+        matrix[name] = [v for p, v in enumerate(matrix[name]) if p != position]
+    matrix['correlation'] = [
+        [v for q, v in enumerate(row) if q != position]
+        for p, row in enumerate(matrix['correlation']) if p != position
+    ]
+    return matrix
+
+
+def pairwise(matrix):
+    """The heatmap panels: {title: N x N array} with row against column."""
+    mean = np.array(matrix['mean'], dtype=np.float64)
+    share = np.array(matrix['weekday_share'], dtype=np.float64)
+    drawdown = np.array(matrix['drawdown'], dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'mean ratio': mean[:, None] / mean[None, :],
+            'weekday share (pp)': 100 * (share[:, None] - share[None, :]),
+            'correlation': np.array(matrix['correlation'], dtype=np.float64),
+            'max drawdown (pp)': 100 * (drawdown[:, None] - drawdown[None, :])
+        }
+
+
+def to_list(values):
+    # NaN is not JSON
+    return [None if pd.isna(v) else float(v) for v in np.asarray(values).ravel()] \
+        if np.ndim(values) < 2 else [to_list(row) for row in values]
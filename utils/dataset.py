@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.daytype import DAY_TYPES
+
+CLEAN_CSV = "data/cta-ridership-clean.csv"
+COLUMNS = ['date', 'day_type', 'bus', 'rail', 'total']
+
+# the column files hold days since 1970-01-01, day type codes (the position
+# in DAY_TYPES) and int32 counts; total is not stored, it is bus + rail
+STORED_COLUMNS = ['day', 'day_type', 'bus', 'rail']
+COUNT_DTYPE = np.int32
+DERIVED_MODES = {'total': ('bus', 'rail')}
+# bumped whenever the column files change shape, older ones are rebuilt
+FORMAT = 2
+
+
+def columns_dir(csv_path):
+    # data/cta-ridership-clean.csv -> data/cta-ridership-clean.columns/
+    return os.path.splitext(csv_path)[0] + ".columns"
+
+
+def csv_checksum(csv_path):
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_meta(csv_path):
+    try:
+        with open(os.path.join(columns_dir(csv_path), "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_csv(csv_path=CLEAN_CSV):
+    return (
+        pd.read_csv(
+            csv_path,
+            parse_dates=['date']
+        )
+        .sort_values('date')
+    )
+
+
+def build_columns(csv_path=CLEAN_CSV, checksum=None):
+    out_dir = columns_dir(csv_path)
+    os.makedirs(out_dir, exist_ok=True)
+    if checksum is None:
+        checksum = csv_checksum(csv_path)
+
+    df = read_csv(csv_path)
+    arrays = {
+        'day': df['date'].to_numpy(dtype='datetime64[D]').astype(np.int32),
+        'day_type': pd.Categorical(df['day_type'], categories=DAY_TYPES).codes.astype(np.int8),
+        **{mode: df[mode].to_numpy(dtype=COUNT_DTYPE) for mode in ['bus', 'rail']}
+    }
+
+    # write every column under a temporary name and move it into place, the
+    # meta file goes last so a reader never sees a half-built version as fresh
+    for name, values in arrays.items():
+        path = os.path.join(out_dir, f"{name}.npy")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.ascontiguousarray(values))
+        os.replace(tmp_path, path)
+
+    meta = {'checksum': checksum, 'format': FORMAT, 'rows': len(df), 'columns': list(arrays)}
+    meta_path = os.path.join(out_dir, "meta.json")
+    tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+    return meta
+
+
+def ensure_columns(csv_path=CLEAN_CSV):
+    checksum = csv_checksum(csv_path)
+    meta = read_meta(csv_path)
+    if meta is None or meta['checksum'] != checksum or meta.get('format') != FORMAT:
+        meta = build_columns(csv_path, checksum)
+    return meta
+
+
+def load_columns(csv_path=CLEAN_CSV, mmap=True):
+    out_dir = columns_dir(csv_path)
+    mmap_mode = 'r' if mmap else None
+    return {
+        name: np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in STORED_COLUMNS
+    }
+
+
+def load_ridership(csv_path=CLEAN_CSV, mmap=True):
+    ensure_columns(csv_path)
+    columns = load_columns(csv_path, mmap=mmap)
+    return pd.DataFrame({
+        'date': columns['day'].astype('datetime64[D]').astype('datetime64[ns]'),
+        'day_type': pd.Categorical.from_codes(columns['day_type'], categories=DAY_TYPES),
+        **{mode: columns[mode] for mode in ['bus', 'rail']}
+    }, copy=False)
+
+
+def compact(df):
+    """`df` (date, day_type and counts) in the in-memory layout: categorical
+    day types, int32 counts and no derived modes."""
+    modes = [c for c in df.columns if c not in ('date', 'day_type') and c not in DERIVED_MODES]
+    return pd.DataFrame({
+        'date': df['date'].to_numpy(dtype='datetime64[ns]'),
+        'day_type': pd.Categorical(df['day_type'], categories=DAY_TYPES),
+        **{
+            mode: df[mode].to_numpy(dtype=COUNT_DTYPE) if pd.api.types.is_integer_dtype(df[mode]) else df[mode].to_numpy()
+            for mode in modes
+        }
+    }, copy=False)
+
+
+def has_mode(df, mode):
+    return mode in df.columns or all(part in df.columns for part in DERIVED_MODES.get(mode, [None]))
+
+
+def mode_values(df, mode):
+    """Daily counts of `mode`, summed from its parts for a derived one."""
+    if mode in df.columns:
+        return df[mode].to_numpy()
+    parts = [df[part].to_numpy() for part in DERIVED_MODES[mode]]
+    if all(np.issubdtype(part.dtype, np.integer) for part in parts):
+        parts = [part.astype(np.int64) for part in parts]
+    return sum(parts[1:], parts[0])
+
+
+def select_modes(df, modes):
+    """date, day_type and `modes` of `df`, derived modes included."""
+    return df[['date', 'day_type']].assign(**{mode: mode_values(df, mode) for mode in modes})
+
+
+if __name__ == '__main__':
+    print(build_columns(CLEAN_CSV))
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+# CTA day types: weekday, saturday, sunday or holiday
+DAY_TYPES = ['W', 'A', 'U']
+
+
+class DayTypeEngine:
+    """Splits any window of the store by day type. The day type of every row
+    is encoded once as a small integer, so a split at any resolution is one
+    bincount over (period, day type) groups per mode instead of an
+    .assign + groupby per call. The daily values are read from the store's
+    own count columns, no copy of them is kept; derived modes are summed for
+    the split rows only."""
+
+    def __init__(self, data, cube, derived_modes, day_types=DAY_TYPES):
+        self.day_types = list(day_types)
+        self.cube = cube
+        self.derived_modes = derived_modes
+        self.codes = pd.Categorical(data['day_type'], categories=self.day_types).codes.astype(np.int8)
+        self.columns = {
+            mode: data[mode].to_numpy() for mode in data.columns if mode not in ('date', 'day_type')
+        }
+
+    def values(self, lo, hi, mode):
+        """Daily counts of `mode` for rows [lo, hi), a view for a stored one."""
+        if mode in self.columns:
+            return self.columns[mode][lo:hi]
+        parts = [self.columns[part][lo:hi] for part in self.derived_modes[mode]]
+        if all(np.issubdtype(part.dtype, np.integer) for part in parts):
+            parts = [part.astype(np.int64) for part in parts]
+        return sum(parts[1:], parts[0])
+
+    def split(self, lo, hi, modes, resolution, aggregation_method):
+        """{day type: DataFrame(date, *modes)} for rows [lo, hi); periods in
+        which a day type has no days are left out of its frame."""
+        empty = pd.DataFrame({'date': np.array([], dtype='datetime64[ns]'), **{mode: [] for mode in modes}})
+        if hi <= lo:
+            return {day_type: empty for day_type in self.day_types}
+
+        level = self.cube.levels[resolution]
+        periods = level['period_of'][lo:hi]
+        first = periods[0]
+        n_periods = periods[-1] - first + 1
+        n_types = len(self.day_types)
+
+        codes = self.codes[lo:hi]
+        known = codes >= 0
+        groups = ((periods - first) * n_types + codes)[known]
+        size = n_periods * n_types
+
+        labels = level['labels'][first:first + n_periods]
+        days = np.bincount(groups, minlength=size).reshape(n_periods, n_types)
+        columns = {}
+        all_known = known.all()
+        for mode in modes:
+            values = self.values(lo, hi, mode)
+            if not all_known:
+                values = values[known]
+            integer = np.issubdtype(values.dtype, np.integer)
+            if integer:
+                # counts are never missing
+                present = None
+            else:
+                present = ~np.isnan(values)
+                values = np.where(present, values, 0)
+            sums = np.bincount(groups, weights=values, minlength=size)
+            # a daily group holds a single day, its mean is the count itself
+            daily = resolution == 'D' and integer
+            if aggregation_method == "mean" and not daily:
+                counts = days.ravel() if present is None else np.bincount(groups[present], minlength=size)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    columns[mode] = (sums / counts).reshape(n_periods, n_types)
+            else:
+                if integer:
+                    sums = np.rint(sums).astype(np.int64)
+                columns[mode] = sums.reshape(n_periods, n_types)
+
+        result = {}
+        for t, day_type in enumerate(self.day_types):
+            keep = days[:, t] > 0
+            result[day_type] = pd.DataFrame({
+                'date': labels[keep],
+                **{mode: columns[mode][keep, t] for mode in modes}
+            })
+        return result
@@ -0,0 +1,94 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def lttb(x, y, max_points):
+    """Largest-Triangle-Three-Buckets: returns the indices of at most
+    `max_points` points that keep the visual shape of the series."""
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = _as_float(x)
+    y = np.nan_to_num(_as_float(y))
+    # first and last points are always kept, the rest is split in buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax(x, y, max_points):
+    """Keeps the minimum and the maximum of `max_points // 2` equally sized
+    buckets, so every peak and dip survives."""
+    n = len(y)
+    if max_points >= n or max_points < 2:
+        return np.arange(n)
+
+    y = _as_float(y)
+    n_buckets = max_points // 2
+    bucket = np.arange(n) * n_buckets // n
+    # sort by bucket, then by value: first and last of each bucket are the
+    # minimum and the maximum (nans sort to the end of their bucket)
+    order = np.lexsort((y, bucket))
+    starts = np.searchsorted(bucket[order], np.arange(n_buckets), side='left')
+    ends = np.concatenate([starts[1:], [n]]) - 1
+    keep = np.union1d(order[starts], order[ends])
+    return keep
+
+
+METHODS = {
+    'lttb': lttb,
+    'minmax': minmax
+}
+
+
+def downsample(x, y, config, name=None):
+    """Applies the downsampling `config` ({'method', 'max_points'}) to one
+    trace; returns the kept x, y and how many points were dropped."""
+    x, y = np.asarray(x), np.asarray(y)
+    method = (config or {}).get('method')
+    if method is None:
+        return x, y, 0
+
+    keep = METHODS[method](x, y, config['max_points'])
+    dropped = len(y) - len(keep)
+    if dropped:
+        logger.debug("%s: %s kept %d of %d points", name, method, len(keep), len(y))
+    return x[keep], y[keep], dropped
+
+
+def downsample_figure(fig, config):
+    """Downsamples every trace of `fig` in place; returns the total number of
+    dropped points."""
+    total = 0
+    for trace in fig.data:
+        x, y, dropped = downsample(trace.x, trace.y, config, name=trace.name)
+        trace.update(x=x, y=y, meta={'dropped_points': dropped})
+        total += dropped
+    return total
@@ -0,0 +1,36 @@
+import base64
+
+import numpy as np
+
+# numpy dtypes plotly.js can decode from a typed array spec
+TYPED_ARRAY_DTYPES = {
+    np.dtype('int8'): 'i1', np.dtype('uint8'): 'u1',
+    np.dtype('int16'): 'i2', np.dtype('uint16'): 'u2',
+    np.dtype('int32'): 'i4', np.dtype('uint32'): 'u4',
+    np.dtype('float32'): 'f4', np.dtype('float64'): 'f8'
+}
+
+
+def typed_array(values):
+    """Encodes a numeric array as a plotly.js typed array spec
+    ({'dtype', 'bdata'}), i.e. base64 of the raw little-endian buffer instead
+    of a JSON list. Dates become milliseconds since the epoch, which plotly
+    reads as dates on an axis of type 'date'."""
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        values = values.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+    elif np.issubdtype(values.dtype, np.integer) and values.dtype not in TYPED_ARRAY_DTYPES:
+        # int64 has no typed array in plotly.js; int32 holds any ridership count
+        info = np.iinfo(np.int32)
+        if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+            values = values.astype(np.int32)
+        else:
+            values = values.astype(np.float64)
+    elif values.dtype not in TYPED_ARRAY_DTYPES:
+        values = values.astype(np.float64)
+
+    values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+    return {
+        'dtype': TYPED_ARRAY_DTYPES[values.dtype.newbyteorder('=')],
+        'bdata': base64.b64encode(values.tobytes()).decode('ascii')
+    }
@@ -0,0 +1,80 @@
+from functools import lru_cache
+
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from utils.presets import DAY_TYPE_NAMES, DAYTYPE_COLORS, FIGURE_TEMPLATES, LINE_LAYOUT, COMPARISON_MATRIX_SCALES
+
+@lru_cache(maxsize=None)
+def figure_layout(template):
+    # every template is built once, on first use; figures start from a copy
+    return go.Layout(LINE_LAYOUT).update(FIGURE_TEMPLATES[template])
+
+
+def line_trace(x, y, name, mode='lines', **props):
+    return go.Scattergl(
+        x=x, y=y, name=name, mode=mode, legendgroup=name,
+        hovertemplate=f"variable={name}<br>date=%{{x}}<br>value=%{{y}}<extra></extra>",
+        **props
+    )
+
+
+def line_figure(x, series, template, mode='lines', **props):
+    """WebGL line chart with one trace per {name: y} of `series`, all over
+    the same `x`; x and y go straight from the arrays into the traces."""
+    return go.Figure(
+        [line_trace(x, y, name, mode=mode, **props) for name, y in series.items()],
+        layout=figure_layout(template)
+    )
+
+
+def frame_figure(df, modes, template, mode='lines', **props):
+    return line_figure(
+        df['date'].to_numpy(), {m: df[m].to_numpy() for m in modes}, template, mode=mode, **props
+    )
+
+
+@lru_cache(maxsize=None)
+def subplot_layout(titles, template=None):
+    # make_subplots is slow, and a day type figure only ever has one of a
+    # handful of facet layouts; the plotly theme is left out so that copies
+    # do not validate it again, the figure applies the default one
+    layout = make_subplots(
+        rows=1, cols=len(titles), shared_yaxes=True, horizontal_spacing=0.03,
+        subplot_titles=list(titles)
+    ).layout
+    layout.template = None
+    if template is not None:
+        layout.update(FIGURE_TEMPLATES[template])
+    return layout
+
+
+def daytype_figure(split, modes, template=None):
+    """One facet per day type of `split`, one WebGL trace per mode."""
+    traces = []
+    for col, df in enumerate(split.values(), start=1):
+        axis = '' if col == 1 else str(col)
+        x = df['date'].to_numpy()
+        for mode, color in zip(modes, DAYTYPE_COLORS):
+            traces.append(go.Scattergl(
+                x=x, y=df[mode].to_numpy(), name=mode, mode='lines',
+                line={'color' : color}, legendgroup=mode, showlegend=col == 1,
+                xaxis=f"x{axis}", yaxis=f"y{axis}"
+            ))
+    titles = tuple(DAY_TYPE_NAMES[day_type] for day_type in split)
+    return go.Figure(traces, layout=subplot_layout(titles, template))
+
+
+def matrix_figure(panels, labels, names):
+    """One heatmap per {title: N x N array} of `panels`, rows and columns in
+    the order of `labels` (long, on the shared y axis) and `names` (short,
+    under every panel)."""
+    traces = []
+    for col, (title, z) in enumerate(panels.items(), start=1):
+        axis = '' if col == 1 else str(col)
+        traces.append(go.Heatmap(
+            z=z, x=names, y=labels, showscale=False, texttemplate="%{z:.2f}",
+            hovertemplate=f"%{{y}} vs %{{x}}<br>{title}: %{{z:.3f}}<extra></extra>",
+            xaxis=f"x{axis}", yaxis=f"y{axis}", **COMPARISON_MATRIX_SCALES[title]
+        ))
+    return go.Figure(traces, layout=subplot_layout(tuple(panels), 'comparison-matrix'))
@@ -0,0 +1,199 @@
+import fcntl
+import glob
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from utils.dataset import CLEAN_CSV, COLUMNS, columns_dir, csv_checksum, ensure_columns
+
+logger = logging.getLogger(__name__)
+
+INCOMING_DIR = "data/incoming"
+RAW_COLUMNS = {
+    'service_date': 'date',
+    'rail_boardings': 'rail',
+    'total_rides': 'total'
+}
+DAY_TYPES = {'W', 'A', 'U'}
+
+
+class IngestError(ValueError):
+    pass
+
+
+def read_raw(path):
+    raw = pd.read_csv(path)
+    missing = set(RAW_COLUMNS) | {'day_type', 'bus'}
+    missing -= set(raw.columns)
+    if missing:
+        raise IngestError(f"{path}: missing columns {sorted(missing)}")
+
+    raw = raw.rename(columns=RAW_COLUMNS)
+    raw['date'] = pd.to_datetime(raw['date'], format="%m/%d/%Y", errors='coerce')
+    return raw[COLUMNS]
+
+
+def validate(rows):
+    """Raises IngestError unless every row is a well formed, unique day."""
+    problems = []
+    if rows['date'].isna().any():
+        problems.append("unparseable service_date")
+    if not rows['day_type'].isin(DAY_TYPES).all():
+        problems.append(f"day_type outside {sorted(DAY_TYPES)}")
+
+    counts = rows[['bus', 'rail', 'total']]
+    if counts.isna().any().any() or not all(np.issubdtype(t, np.integer) for t in counts.dtypes):
+        problems.append("non integer ridership counts")
+    elif (counts < 0).any().any():
+        problems.append("negative ridership counts")
+    elif (rows['bus'] + rows['rail'] != rows['total']).any():
+        problems.append("total_rides != bus + rail_boardings")
+
+    if rows['date'].duplicated().any():
+        problems.append("conflicting rows for the same service_date")
+    if problems:
+        raise IngestError(", ".join(problems))
+
+
+def new_rows(raw, after):
+    """Exact duplicates are dropped first, then everything up to `after`
+    (the last day already in the store) is skipped before validation."""
+    rows = raw.drop_duplicates()
+    if after is not None:
+        rows = rows.loc[~(rows['date'] <= after)]
+    rows = rows.sort_values('date')
+    validate(rows)
+    return rows.reset_index(drop=True)
+
+
+def append_rows(rows, csv_path=CLEAN_CSV):
+    if rows.empty:
+        return ensure_columns(csv_path)
+    with open(csv_path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    with open(csv_path, 'a', newline='') as f:
+        rows.to_csv(f, header=False, index=False, date_format="%Y-%m-%d")
+    return ensure_columns(csv_path)
+
+
+@contextmanager
+def csv_lock(csv_path=CLEAN_CSV):
+    """Exclusive flock shared by every process that reads or extends the
+    clean CSV at `csv_path`, so workers ingest one after another and never
+    load a half-appended file."""
+    lock_dir = columns_dir(csv_path)
+    os.makedirs(lock_dir, exist_ok=True)
+    with open(os.path.join(lock_dir, "ingest.lock"), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def reload(handle, store_loader, csv_path=CLEAN_CSV):
+    """Swaps a store of the current clean CSV into `handle`; call it with
+    the csv_lock held."""
+    ensure_columns(csv_path)
+    handle.swap(store_loader(csv_path))
+    logger.info("reloaded %s, dataset version %s", csv_path, handle.version[:12])
+
+
+def ingest_file(path, handle, store_loader, csv_path=CLEAN_CSV):
+    """Appends the new days of the raw delta file at `path` to the clean CSV
+    and swaps the extended store into `handle`. Returns how many days were
+    added. The store is reloaded first when another process changed the
+    CSV since it was built, so only days missing from the CSV get added."""
+    raw = read_raw(path)
+    with csv_lock(csv_path):
+        if csv_checksum(csv_path) != handle.version:
+            reload(handle, store_loader, csv_path)
+        store = handle.current()
+        rows = new_rows(raw, after=store.dates[-1] if len(store) else None)
+        if rows.empty:
+            return 0
+
+        meta = append_rows(rows, csv_path)
+        handle.swap(store.append(rows, version=meta['checksum']))
+    logger.info("ingested %d days from %s, dataset version %s", len(rows), path, meta['checksum'][:12])
+    return len(rows)
+
+
+def claim(path):
+    # renaming is atomic, so with several workers watching the same
+    # directory only one of them gets to ingest a given file
+    claimed = os.path.join(os.path.dirname(path), "processing", os.path.basename(path))
+    os.makedirs(os.path.dirname(claimed), exist_ok=True)
+    try:
+        os.rename(path, claimed)
+    except OSError:
+        return None
+    return claimed
+
+
+def finish(claimed, outcome):
+    done = os.path.join(os.path.dirname(os.path.dirname(claimed)), outcome, os.path.basename(claimed))
+    os.makedirs(os.path.dirname(done), exist_ok=True)
+    os.replace(claimed, done)
+
+
+class DatasetWatcher(threading.Thread):
+    """Polls `incoming_dir` for raw delta files and ingests them; also picks
+    up changes of the clean CSV made by another process (another worker or
+    `python -m utils.ingest`) and reloads the store from it."""
+
+    def __init__(self, handle, store_loader, csv_path=CLEAN_CSV, incoming_dir=INCOMING_DIR, interval=30):
+        super().__init__(daemon=True, name="dataset-watcher")
+        self.handle = handle
+        self.store_loader = store_loader
+        self.csv_path = csv_path
+        self.incoming_dir = incoming_dir
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def poll(self):
+        for path in sorted(glob.glob(os.path.join(self.incoming_dir, "*.csv"))):
+            claimed = claim(path)
+            if claimed is None:
+                continue
+            try:
+                ingest_file(claimed, self.handle, self.store_loader, self.csv_path)
+            except (IngestError, OSError, ValueError) as e:
+                logger.error("rejected %s: %s", path, e)
+                finish(claimed, "rejected")
+            else:
+                finish(claimed, "processed")
+
+        with csv_lock(self.csv_path):
+            if csv_checksum(self.csv_path) != self.handle.version:
+                reload(self.handle, self.store_loader, self.csv_path)
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("dataset watcher poll failed")
+
+
+if __name__ == '__main__':
+    # python -m utils.ingest <raw delta csv>... appends to the clean CSV;
+    # running apps pick the new version up on their next poll
+    from utils.store import DatasetHandle, RidershipStore
+
+    logging.basicConfig(level=logging.INFO)
+    handle = DatasetHandle(RidershipStore.from_csv(CLEAN_CSV))
+    for path in sys.argv[1:]:
+        print(f"{path}: {ingest_file(path, handle, RidershipStore.from_csv)} new days")
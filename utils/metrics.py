@@ -0,0 +1,177 @@
+import cProfile
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Response, g, request
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CALLBACK_PATH = "/_dash-update-component"
+# background jobs whose result is never collected are forgotten after this
+# many seconds
+JOB_TIMEOUT = 3600
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        cumulative += self.counts[-1]
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+class CallbackMetrics:
+    """Times every request to the Dash callback endpoint and keeps, per
+    callback, call counts by status, latency and request/response size
+    histograms. They are served in Prometheus text format at /metrics. A
+    background callback is counted once per job, with the time from the
+    request starting it to the poll collecting its result; the polls in
+    between are not calls of their own.
+
+    With `profile_threshold` (seconds) set, each callback runs under cProfile
+    and the stats of calls slower than the threshold are dumped to
+    `profile_dir`."""
+
+    def __init__(self, app, profile_threshold=None, profile_dir="profiles"):
+        self.app = app
+        self.profile_threshold = profile_threshold
+        self.profile_dir = profile_dir
+
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.request_bytes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self.response_bytes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+        self._jobs = {}
+
+        server = app.server
+        server.before_request(self._before)
+        server.after_request(self._after)
+        server.add_url_rule("/metrics", "metrics", self.metrics_view)
+
+    def callback_name(self, output):
+        entry = self.app.callback_map.get(output)
+        if entry is not None:
+            return getattr(entry.get('callback'), '__name__', output)
+        return output
+
+    def is_background(self, output):
+        entry = self.app.callback_map.get(output)
+        return bool(entry and entry.get('background'))
+
+    def _background_call(self, response, elapsed, size_in):
+        """(elapsed, request size) of the whole job when `response` brings
+        a background callback's result, None for the request starting the
+        job and the polls while it runs."""
+        now = time.perf_counter()
+        job = request.args.get('job')
+        if job is None:
+            started = response.status_code == 200 and (response.get_json(silent=True) or {}).get('job')
+            if not started:
+                return elapsed, size_in
+            with self._lock:
+                for old in [j for j, (start, _) in self._jobs.items() if now - start > JOB_TIMEOUT]:
+                    del self._jobs[old]
+                self._jobs[started] = (now - elapsed, size_in)
+            return None
+
+        if response.status_code == 200 and 'response' not in (response.get_json(silent=True) or {}):
+            return None
+        # a job started by another worker is timed from this poll only
+        with self._lock:
+            start, size_in = self._jobs.pop(job, (now - elapsed, size_in))
+        return now - start, size_in
+
+    def _before(self):
+        if request.path != CALLBACK_PATH:
+            return
+        g.callback_start = time.perf_counter()
+        g.callback_profiler = None
+        if self.profile_threshold is not None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # another thread is already being profiled
+                return
+            g.callback_profiler = profiler
+
+    def _after(self, response):
+        start = g.pop('callback_start', None)
+        if start is None:
+            return response
+        profiler = g.pop('callback_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+        elapsed = time.perf_counter() - start
+
+        body = request.get_json(silent=True) or {}
+        output = body.get('output', 'unknown')
+        name = self.callback_name(output)
+        size_in = request.content_length or 0
+        size_out = response.calculate_content_length() or 0
+        if self.is_background(output):
+            call = self._background_call(response, elapsed, size_in)
+            if call is None:
+                return response
+            elapsed, size_in = call
+
+        with self._lock:
+            self.calls[(name, response.status_code)] += 1
+            self.latency[name].observe(elapsed)
+            self.request_bytes[name].observe(size_in)
+            self.response_bytes[name].observe(size_out)
+
+        if profiler is not None and elapsed >= self.profile_threshold:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            safe_name = re.sub(r'[^\w.-]+', '_', name)[:80]
+            profiler.dump_stats(os.path.join(
+                self.profile_dir, f"{safe_name}-{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms.prof"
+            ))
+        return response
+
+    def render(self):
+        lines = [
+            "# HELP dash_callback_calls_total Dash callback requests by callback and HTTP status.",
+            "# TYPE dash_callback_calls_total counter"
+        ]
+        with self._lock:
+            for (name, status), count in sorted(self.calls.items()):
+                lines.append(f'dash_callback_calls_total{{callback="{escape(name)}",status="{status}"}} {count}')
+
+            histograms = [
+                ("dash_callback_latency_seconds", "Dash callback request latency.", self.latency),
+                ("dash_callback_request_bytes", "Dash callback request body size.", self.request_bytes),
+                ("dash_callback_response_bytes", "Dash callback response body size.", self.response_bytes)
+            ]
+            for metric, help_text, per_callback in histograms:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for name, histogram in sorted(per_callback.items()):
+                    lines.extend(histogram.lines(metric, f'callback="{escape(name)}"'))
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -19,10 +19,122 @@ MAIN_FIGURE_LAYOUT = {
     }
 }
 
+ZOOMED_FIGURE_LAYOUT = {
+    'margin': {'t': 5, 'b': 0},
+    'showlegend': False,
+    'xaxis': {
+        'title': 'Date',
+        'rangeslider': {'visible': True},
+        'type': 'date'
+    },
+    'yaxis': {'title': 'value'}
+}
+
 COMPARISON_UNIT_WIDTH = 3
 
+# every mode a chart can show, in trace order
+ALL_MODES = ['bus', 'rail']
+
 DEFAULT_MODES = ['bus', 'rail']
 DEFAULT_RESOLUTION = 'W'
 DEFAULT_AGGREGATION = 'mean'
 
-DAYTYPE_COLORS = ['gold', 'blue']
\ No newline at end of file
+# the options of the input table: resolutions of the historic (main),
+# selection (zoomed) and day type rows, and the aggregations of all three
+RESOLUTION_OPTIONS = {
+    'main': ['D', 'W', 'M'],
+    'zoomed': ['D', 'W', 'M'],
+    'daytype': ['D', 'W', 'M', 'Q', 'Y']
+}
+AGGREGATION_OPTIONS = ['mean', 'sum']
+
+DAYTYPE_COLORS = ['gold', 'blue']
+
+# layout templates of the figure builders in utils/figures.py; every line
+# chart starts from LINE_LAYOUT, the axis and legend titles plotly express
+# used to give them
+LINE_LAYOUT = {
+    'xaxis': {'title': {'text': 'date'}},
+    'yaxis': {'title': {'text': 'value'}},
+    'legend': {'title': {'text': 'variable'}, 'tracegroupgap': 0},
+    'margin': {'t': 60}
+}
+FIGURE_TEMPLATES = {
+    'main': MAIN_FIGURE_LAYOUT,
+    'zoomed': ZOOMED_FIGURE_LAYOUT,
+    'comparison': COMPARISON_DIV_LAYOUT,
+    'close-comparison': {'margin': COMPARISON_DIV_LAYOUT['margin']},
+    'comparison-matrix': {
+        'margin': {'t': 30, 'l': 0, 'r': 0, 'b': 0},
+        'height': 300,
+        'yaxis': {'autorange': 'reversed'}
+    }
+}
+
+# colour scale and midpoint of every comparison matrix panel
+COMPARISON_MATRIX_SCALES = {
+    'mean ratio': {'colorscale': 'RdBu', 'zmid': 1},
+    'weekday share (pp)': {'colorscale': 'RdBu', 'zmid': 0},
+    'correlation': {'colorscale': 'RdBu', 'zmin': -1, 'zmax': 1},
+    'max drawdown (pp)': {'colorscale': 'RdBu', 'zmid': 0}
+}
+
+# overlay options of the main and zoomed charts: rolling means over that
+# many days, or the same window one year earlier
+OVERLAYS = {'7': '7-day mean', '28': '28-day mean', '365': '365-day mean', 'yoy': 'previous year'}
+DAY_TYPE_NAMES = {'W': 'weekday', 'A': 'saturday', 'U': 'sunday/holiday'}
+RESOLUTION_NAMES = {'D': 'day', 'W': 'week', 'M': 'month', 'Q': 'quarter', 'Y': 'year'}
+
+# server-side downsampling per chart, `method` is 'lttb', 'minmax' or None
+# to send every point; `max_points` is roughly the chart width in pixels
+DOWNSAMPLING = {
+    'time-series-chart': {'method': 'lttb', 'max_points': 1500},
+    'zoomed-time-series-chart': {'method': 'minmax', 'max_points': 800}
+}
+
+# zooming or panning the zoomed chart redraws the visible range plus
+# `margin` of its width on both sides at the finest of `levels` that keeps
+# it within `max_points` points, so a week shows days and decades months;
+# only means move between levels, a sum stays at the chosen resolution
+ZOOMED_REFINEMENT = {
+    'levels': ['D', 'W', 'M', 'Q', 'Y'],
+    'max_points': DOWNSAMPLING['zoomed-time-series-chart']['max_points'],
+    'margin': 0.5
+}
+
+# cache of the comparison figures and the initial main chart, `disk_dir`
+# None keeps it in memory only
+FIGURE_CACHE = {
+    'max_memory_bytes': 64 << 20,
+    'disk_dir': 'data/.figure-cache',
+    'max_disk_bytes': 256 << 20
+}
+
+# views computed in a background thread at startup and after every dataset
+# swap, into the figure cache: the main chart's traces for every option of
+# the input table, and the zoomed and day type charts of every option over
+# each of `windows`, (from, till) dates or the last N days of the dataset
+WARM_CACHE = {
+    'windows': [90, 365, ('2019-01-01', '2019-12-31'), ('2020-01-01', '2020-12-31')]
+}
+
+# saved comparison timeframes live on the server; `directory` None keeps
+# them in the process, which is only right with a single worker
+SESSION_STORE = {
+    'directory': 'data/.sessions',
+    'ttl': 24 * 3600
+}
+
+# with `enabled` (and diskcache installed) the zoomed and day type callbacks
+# run as background jobs, a forked process per render that a newer render
+# terminates. Off by default: a render takes milliseconds, less than the
+# fork and the polling, and stale selections are already dropped by the
+# request sequence check; the jobs are also forked from a worker running
+# the watcher and warm-up threads. `expire` (seconds) bounds how long job results
+# are kept and the browser polls a running job every `interval` milliseconds
+BACKGROUND_CALLBACKS = {
+    'enabled': False,
+    'cache_dir': 'data/.background-cache',
+    'expire': 600,
+    'interval': 250
+}
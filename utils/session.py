@@ -0,0 +1,81 @@
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+SESSION_ID = re.compile(r'^[0-9a-f-]{8,64}$')
+
+
+def new_session():
+    # saved timeframes in the order they were saved, the unit index shown
+    # in the left/right close comparison slot, the comparison metrics of
+    # all saved timeframes and the newest selection request seen
+    return {'units': [], 'slots': [None, None], 'matrix': None, 'selection_seq': 0}
+
+
+class SessionStore:
+    """Per browser session state kept on the server, so callbacks exchange a
+    session id instead of the whole comparison tree. With `directory` every
+    session is a JSON file guarded by an flock, which the gunicorn workers
+    share; without it sessions live in this process only. Sessions untouched
+    for `ttl` seconds are dropped."""
+
+    def __init__(self, directory=None, ttl=24 * 3600, sweep_interval=600):
+        self.directory = directory
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._last_sweep = time.time()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        if not SESSION_ID.match(session_id or ''):
+            raise ValueError(f"invalid session id {session_id!r}")
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    @contextmanager
+    def edit(self, session_id):
+        """Yields the session state for in-place changes and stores it
+        afterwards; concurrent edits of one session are serialized."""
+        self._maybe_sweep()
+        if self.directory is None:
+            with self._lock:
+                state = self._sessions.setdefault(session_id, new_session())
+                state['touched'] = time.time()
+                yield state
+            return
+
+        with open(self._path(session_id), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else new_session()
+                yield state
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        if self.directory is None:
+            with self._lock:
+                for session_id in [s for s, state in self._sessions.items() if now - state['touched'] > self.ttl]:
+                    del self._sessions[session_id]
+            return
+        for entry in os.scandir(self.directory):
+            try:
+                if now - entry.stat().st_mtime > self.ttl:
+                    os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,226 @@
+import glob
+import json
+import os
+import shutil
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from utils.daytype import DAY_TYPES
+from utils.store import RidershipStore
+
+STATIONS_DIR = "data/stations"
+
+# one row of a partition: day offset since the epoch, day type code, entries
+ROW = np.dtype([('day', '<i4'), ('day_type', 'u1'), ('rides', '<i4')])
+
+# columns of the CTA "L" station entries export
+RAW_COLUMNS = {
+    'station_id': 'station_id',
+    'stationname': 'station_name',
+    'date': 'date',
+    'daytype': 'day_type',
+    'rides': 'rides'
+}
+
+
+# line flag columns of the CTA "L" stops list
+LINE_COLUMNS = {
+    'RED': 'Red', 'BLUE': 'Blue', 'G': 'Green', 'BRN': 'Brown',
+    'P': 'Purple', 'Pexp': 'Purple', 'Y': 'Yellow', 'Pnk': 'Pink', 'O': 'Orange'
+}
+
+
+def read_station_lines(stops_csv):
+    """{station id: [line, ...]} from the CTA "L" stops list, whose MAP_ID
+    is the station id of the entries export."""
+    stops = pd.read_csv(stops_csv)
+    station_lines = defaultdict(set)
+    for column, line in LINE_COLUMNS.items():
+        if column not in stops:
+            continue
+        flagged = stops[column].astype(str).str.lower().isin(['true', '1'])
+        for station in stops.loc[flagged, 'MAP_ID']:
+            station_lines[int(station)].add(line)
+    return {station: sorted(lines) for station, lines in station_lines.items()}
+
+
+def partition_path(root, year, station_id):
+    return os.path.join(root, f"year={year}", f"station={station_id}.npy")
+
+
+def read_chunks(raw_csv, chunksize):
+    for chunk in pd.read_csv(raw_csv, usecols=list(RAW_COLUMNS), chunksize=chunksize):
+        chunk = chunk.rename(columns=RAW_COLUMNS)
+        chunk['date'] = pd.to_datetime(chunk['date'], format="%m/%d/%Y")
+        yield chunk.drop_duplicates(['station_id', 'date'])
+
+
+def build_partitions(raw_csv, root=STATIONS_DIR, station_lines=None, chunksize=1_000_000):
+    """Streams the raw station CSV in chunks into one .npy file per (year,
+    station) and builds the rollups on the way, so memory stays bounded by
+    the chunk size. `station_lines` maps station ids to the lines serving
+    them and enables the per line rollups."""
+    tmp_root = f"{root}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    parts_root = os.path.join(tmp_root, "parts")
+
+    station_names = {}
+    station_years = defaultdict(lambda: defaultdict(int))
+    calendar = {}
+    day_type_codes = {day_type: code for code, day_type in enumerate(DAY_TYPES)}
+
+    for n, chunk in enumerate(read_chunks(raw_csv, chunksize)):
+        days = (chunk['date'].to_numpy(dtype='datetime64[D]').astype(np.int64)).astype(np.int32)
+        codes = chunk['day_type'].map(day_type_codes).fillna(255).astype(np.uint8).to_numpy()
+        rows = np.empty(len(chunk), dtype=ROW)
+        rows['day'], rows['day_type'], rows['rides'] = days, codes, chunk['rides'].to_numpy()
+
+        years = chunk['date'].dt.year.to_numpy()
+        stations = chunk['station_id'].to_numpy()
+        station_names.update(zip(stations.tolist(), chunk['station_name'].tolist()))
+        calendar.update(zip(days.tolist(), codes.tolist()))
+
+        # every chunk leaves one part per partition it touched
+        order = np.lexsort((days, stations, years))
+        sorted_keys = np.stack([years[order], stations[order]], axis=1)
+        boundaries = np.flatnonzero(np.any(np.diff(sorted_keys, axis=0) != 0, axis=1)) + 1
+        for part in np.split(order, boundaries):
+            year, station = int(years[part[0]]), int(stations[part[0]])
+            path = os.path.join(parts_root, f"year={year}", f"station={station}", f"part-{n:05d}.npy")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, rows[part])
+
+    calendar_days = np.array(sorted(calendar), dtype=np.int32)
+    daily = np.zeros(len(calendar_days), dtype=np.int64)
+    line_daily = {}
+
+    # compaction: one sorted file per partition, duplicates of a station-day
+    # from different chunks dropped; the rollups are summed from the result
+    # so they count every station-day once, like the partitions
+    for part_dir in glob.glob(os.path.join(parts_root, "year=*", "station=*")):
+        year = os.path.basename(os.path.dirname(part_dir)).split("=")[1]
+        station = os.path.basename(part_dir).split("=")[1]
+        rows = np.concatenate([np.load(p) for p in sorted(glob.glob(os.path.join(part_dir, "*.npy")))])
+        rows = rows[np.argsort(rows['day'], kind='stable')]
+        _, first = np.unique(rows['day'], return_index=True)
+        rows = rows[first]
+        path = partition_path(tmp_root, year, station)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.save(path, rows)
+
+        positions = np.searchsorted(calendar_days, rows['day'])
+        np.add.at(daily, positions, rows['rides'])
+        station_years[int(station)][int(year)] += int(rows['rides'].sum(dtype=np.int64))
+        for line in (station_lines or {}).get(int(station), []):
+            if line not in line_daily:
+                line_daily[line] = np.zeros(len(calendar_days), dtype=np.int64)
+            np.add.at(line_daily[line], positions, rows['rides'])
+    shutil.rmtree(parts_root)
+
+    rollups = os.path.join(tmp_root, "rollups")
+    os.makedirs(rollups)
+    calendar_codes = [calendar[day] for day in calendar_days.tolist()]
+    np.save(os.path.join(rollups, "calendar.npy"), np.array(
+        list(zip(calendar_days.tolist(), calendar_codes, daily.tolist())), dtype=ROW
+    ))
+    for line, per_day in line_daily.items():
+        np.save(os.path.join(rollups, f"line={line}.npy"), np.array(
+            list(zip(calendar_days.tolist(), calendar_codes, per_day.tolist())), dtype=ROW
+        ))
+
+    catalog = {
+        'stations': {
+            str(station): {
+                'name': station_names[station],
+                'lines': list((station_lines or {}).get(station, [])),
+                'rides_per_year': {str(year): rides for year, rides in sorted(years.items())}
+            }
+            for station, years in sorted(station_years.items())
+        },
+        'lines': sorted(line_daily)
+    }
+    with open(os.path.join(tmp_root, "catalog.json"), 'w') as f:
+        json.dump(catalog, f)
+
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp_root, root)
+    return catalog
+
+
+class StationStore:
+    """Reads the partitioned station data lazily: a subset only memory-maps
+    the partitions of its stations and years, lines and the whole system
+    come straight from the rollups."""
+
+    def __init__(self, root=STATIONS_DIR):
+        self.root = root
+        with open(os.path.join(root, "catalog.json")) as f:
+            self.catalog = json.load(f)
+
+    def stations(self, line=None):
+        return [
+            int(station) for station, info in self.catalog['stations'].items()
+            if line is None or line in info['lines']
+        ]
+
+    def _years(self, station, min_year, max_year):
+        years = self.catalog['stations'][str(station)]['rides_per_year']
+        return [int(y) for y in years if min_year <= int(y) <= max_year]
+
+    def _load_rollup(self, name):
+        return np.load(os.path.join(self.root, "rollups", f"{name}.npy"), mmap_mode='r')
+
+    def daily(self, stations=None, line=None, min_year=0, max_year=9999):
+        """Daily rail entries of `stations`, of `line`, or of the whole
+        system, as a frame shaped like the clean system-wide table (date,
+        day_type, rail)."""
+        calendar = self._load_rollup("calendar")
+        if stations is None:
+            rows = self._load_rollup(f"line={line}") if line is not None else calendar
+            rides = np.asarray(rows['rides'], dtype=np.int64)
+        else:
+            # sum the subset's partitions onto the calendar, one at a time
+            rides = np.zeros(len(calendar), dtype=np.int64)
+            for station in stations:
+                for year in self._years(station, min_year, max_year):
+                    part = np.load(partition_path(self.root, year, station), mmap_mode='r')
+                    positions = np.searchsorted(calendar['day'], part['day'])
+                    np.add.at(rides, positions, part['rides'])
+            rows = calendar
+
+        days = np.asarray(rows['day'], dtype=np.int64)
+        keep = (days >= (np.datetime64(f"{min_year:04d}-01-01") - np.datetime64(0, 'D')).astype(np.int64)) \
+            if min_year > 0 else np.ones(len(days), dtype=bool)
+        if max_year < 9999:
+            keep &= days < (np.datetime64(f"{max_year + 1:04d}-01-01") - np.datetime64(0, 'D')).astype(np.int64)
+        codes = np.asarray(calendar['day_type'])
+        day_types = np.array(DAY_TYPES + ['?'])[np.minimum(codes, len(DAY_TYPES))]
+        return pd.DataFrame({
+            'date': days[keep].astype('datetime64[D]').astype('datetime64[ns]'),
+            'day_type': day_types[keep],
+            'rail': rides[keep]
+        })
+
+    def store(self, stations=None, line=None, min_year=0, max_year=9999):
+        """A RidershipStore over the subset, so get_df and the comparison
+        views work on it with modes=['rail']."""
+        data = self.daily(stations, line, min_year, max_year)
+        key = json.dumps([sorted(stations) if stations else None, line, min_year, max_year])
+        return RidershipStore(data, version=f"stations:{key}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="partitions the CTA station entries export")
+    parser.add_argument("entries_csv")
+    parser.add_argument("--stops", help="CTA \"L\" stops list, enables the per line rollups")
+    parser.add_argument("--root", default=STATIONS_DIR)
+    parser.add_argument("--chunksize", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    station_lines = read_station_lines(args.stops) if args.stops else None
+    catalog = build_partitions(args.entries_csv, args.root, station_lines, args.chunksize)
+    print(f"{len(catalog['stations'])} stations, {len(catalog['lines'])} lines in {args.root}")
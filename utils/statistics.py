@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from utils.aggregation import PERIOD_ALIASES
+from utils.dataset import has_mode, mode_values
+
+ROLLING_WINDOWS = (7, 28, 365)
+
+
+class RollingStats:
+    """Trailing rolling means over calendar-day windows for every row of the
+    sorted store. Each mean is a difference of two prefix sums, so the whole
+    column costs O(n) at load, appended rows only add their own values, and a
+    chart window is a slice of the precomputed columns. A mean is NaN until
+    the data covers its whole window."""
+
+    def __init__(self, data, modes=('bus', 'rail', 'total'), windows=ROLLING_WINDOWS):
+        self.windows = tuple(windows)
+        self.modes = [mode for mode in modes if has_mode(data, mode)]
+        self.dates = data['date'].to_numpy(dtype='datetime64[ns]')
+        self.sums = {}
+        self.counts = {}
+        for mode in self.modes:
+            values = mode_values(data, mode).astype(np.float64)
+            present = ~np.isnan(values)
+            self.sums[mode] = np.concatenate([[0], np.cumsum(np.where(present, values, 0))])
+            self.counts[mode] = np.concatenate([np.zeros(1, np.int32), np.cumsum(present, dtype=np.int32)])
+        self.means = {
+            (mode, window): self._means(mode, window, 0)
+            for mode in self.modes for window in self.windows
+        }
+
+    def _means(self, mode, window, start):
+        # rolling means of the rows from `start` on; their windows may reach
+        # back into rows before it
+        dates = self.dates[start:]
+        lo = np.searchsorted(self.dates, dates - np.timedelta64(window - 1, 'D'), side='left')
+        hi = np.arange(start + 1, len(self.dates) + 1)
+        sums = self.sums[mode][hi] - self.sums[mode][lo]
+        counts = self.counts[mode][hi] - self.counts[mode][lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        means[dates - np.timedelta64(window - 1, 'D') < self.dates[0]] = np.nan
+        return means
+
+    def extend(self, rows):
+        """New stats with `rows` (all later than the last stored day) added;
+        only the rolling means of the new rows are computed."""
+        stats = RollingStats.__new__(RollingStats)
+        stats.windows = self.windows
+        stats.modes = self.modes
+        stats.dates = np.concatenate([self.dates, rows['date'].to_numpy(dtype='datetime64[ns]')])
+        stats.sums = {}
+        stats.counts = {}
+        for mode in self.modes:
+            values = mode_values(rows, mode).astype(np.float64)
+            present = ~np.isnan(values)
+            stats.sums[mode] = np.concatenate([self.sums[mode], self.sums[mode][-1] + np.cumsum(np.where(present, values, 0))])
+            stats.counts[mode] = np.concatenate([self.counts[mode], self.counts[mode][-1] + np.cumsum(present, dtype=np.int32)])
+        stats.means = {
+            (mode, window): np.concatenate([means, stats._means(mode, window, len(self.dates))])
+            for (mode, window), means in self.means.items()
+        }
+        return stats
+
+    def rolling(self, lo, hi, modes, window, level=None):
+        """DataFrame(date, *modes) of the `window` day means for rows [lo, hi).
+        With an aggregation cube `level` there is one row per period instead,
+        the mean as of its last selected day, labelled like the cube does."""
+        if level is None or hi <= lo:
+            rows, dates = slice(lo, hi), self.dates[lo:hi]
+        else:
+            first, last = level['period_of'][lo], level['period_of'][hi - 1]
+            rows = np.minimum(level['starts'][first + 1:last + 2], hi) - 1
+            dates = level['labels'][first:last + 1]
+        return pd.DataFrame({
+            'date': dates,
+            **{mode: self.means[(mode, window)][rows] for mode in modes}
+        })
+
+
+def year_over_year(store, min_date, max_date, modes, resolution, aggregation_method):
+    """The same calendar window one year earlier, aggregated like the chart
+    and with its dates moved onto the current periods so it overlays them.
+    Weeks come from 52 weeks earlier so they end on the same day as the
+    current ones, months and longer get the current period's last day, and
+    a 29 February has no day of its own to land on and is left out."""
+    min_date, max_date = pd.Timestamp(min_date), pd.Timestamp(max_date)
+    shift = pd.DateOffset(weeks=52) if resolution == 'W' else pd.DateOffset(years=1)
+    df = store.aggregate(min_date - shift, max_date - shift, modes, resolution, aggregation_method)
+    df['date'] = df['date'] + shift
+    if resolution == 'D':
+        # a 29 February lands on the 28th, right after the real one
+        dates = df['date'].to_numpy()
+        keep = np.concatenate([[True], dates[1:] != dates[:-1]]) & (dates >= min_date.to_datetime64())
+        if not keep.all():
+            df = pd.DataFrame({name: column.to_numpy()[keep] for name, column in df.items()})
+    elif resolution != 'W':
+        df['date'] = df['date'].dt.to_period(PERIOD_ALIASES[resolution]).dt.end_time.dt.normalize()
+    return df
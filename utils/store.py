@@ -0,0 +1,143 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.aggregation import AggregationCube
+from utils.daytype import DayTypeEngine
+from utils.dataset import CLEAN_CSV, DERIVED_MODES, compact, load_ridership, read_meta, select_modes
+from utils.statistics import RollingStats, year_over_year
+
+
+class RidershipStore:
+    """The sorted daily ridership table, in the compact layout of
+    `dataset.compact`, together with everything derived from it once at load
+    time: the datetime64 column used for range lookups, the aggregation cube
+    and the rolling means. `version` identifies the dataset the store was built
+    from, derived caches key on it."""
+
+    def __init__(self, data, version=None, rolling_stats=None):
+        if not data['date'].is_monotonic_increasing:
+            data = data.sort_values('date')
+        self.data = compact(data)
+        self.dates = self.data['date'].to_numpy(dtype='datetime64[ns]')
+        self.cube = AggregationCube(self.data)
+        self.daytypes = DayTypeEngine(self.data, self.cube, DERIVED_MODES)
+        self.rolling_stats = rolling_stats if rolling_stats is not None else RollingStats(self.data)
+        self.version = version
+
+    @classmethod
+    def from_csv(cls, csv_path=CLEAN_CSV):
+        data = load_ridership(csv_path)
+        return cls(data, version=read_meta(csv_path)['checksum'])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def bounds(self, min_date, max_date):
+        """Row positions [lo, hi) of the days between min_date and max_date,
+        both inclusive, found by binary search on the sorted dates."""
+        lo = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(min_date), 'ns'), side='left')
+        hi = np.searchsorted(self.dates, np.datetime64(pd.Timestamp(max_date), 'ns'), side='right')
+        return int(lo), int(hi)
+
+    def window(self, min_date, max_date, modes=None):
+        """Rows between min_date and max_date. Without `modes` this is a
+        positional slice, i.e. a view on the store; with `modes` the columns
+        are narrowed to date, day_type and the given modes, derived ones
+        (total) computed for the slice only."""
+        lo, hi = self.bounds(min_date, max_date)
+        df = self.data.iloc[lo:hi]
+        if modes is not None:
+            df = select_modes(df, modes)
+        return df
+
+    def selection(self, min_date, max_date):
+        return StoreWindow(self, min_date, max_date)
+
+    def append(self, rows, version=None):
+        """New store with `rows` (already cleaned, all later than the last
+        stored day) added at the end; this store is left untouched."""
+        data = pd.concat([self.data, compact(rows)[self.data.columns]], ignore_index=True)
+        return RidershipStore(data, version=version, rolling_stats=self.rolling_stats.extend(rows))
+
+    def aggregate(self, min_date, max_date, modes, resolution, aggregation_method):
+        return self.selection(min_date, max_date).aggregate(modes, resolution, aggregation_method)
+
+    def split_daytypes(self, min_date, max_date, modes, resolution, aggregation_method):
+        return self.selection(min_date, max_date).split_daytypes(modes, resolution, aggregation_method)
+
+    def rolling(self, min_date, max_date, modes, window, resolution='D', aggregation_method='mean'):
+        return self.selection(min_date, max_date).rolling(modes, window, resolution, aggregation_method)
+
+    def year_over_year(self, min_date, max_date, modes, resolution, aggregation_method):
+        return year_over_year(self, min_date, max_date, modes, resolution, aggregation_method)
+
+
+class StoreWindow:
+    """The rows [lo, hi) of one selected date range. Every view of the
+    selection (aggregated, split by day type, rolling) is read from it, so
+    the dates are searched once per selection and not once per view."""
+
+    def __init__(self, store, min_date, max_date):
+        self.store = store
+        self.min_date, self.max_date = min_date, max_date
+        self.lo, self.hi = store.bounds(min_date, max_date)
+
+    def aggregate(self, modes, resolution, aggregation_method):
+        return self.store.cube.aggregate(self.lo, self.hi, modes, resolution, aggregation_method)
+
+    def finest(self, resolutions, max_points):
+        """The first of `resolutions` (finest first) the window has at most
+        `max_points` points at, the last one when none fits."""
+        for resolution in resolutions:
+            if self.store.cube.periods(self.lo, self.hi, resolution) <= max_points:
+                return resolution
+        return resolutions[-1]
+
+    def split_daytypes(self, modes, resolution, aggregation_method):
+        return self.store.daytypes.split(self.lo, self.hi, modes, resolution, aggregation_method)
+
+    def rolling(self, modes, window, resolution='D', aggregation_method='mean'):
+        """The `window` day means per period; for a sum, each mean times the
+        days the period has, the period's total at the trailing rate, so it
+        sits on the same scale as the summed chart."""
+        level = self.store.cube.levels[resolution] if resolution != 'D' else None
+        df = self.store.rolling_stats.rolling(self.lo, self.hi, modes, window, level)
+        if aggregation_method == "sum" and level is not None:
+            for mode in modes:
+                df[mode] = df[mode] * self.store.cube.days(self.lo, self.hi, mode, resolution)
+        return df
+
+    def year_over_year(self, modes, resolution, aggregation_method):
+        return year_over_year(self.store, self.min_date, self.max_date, modes, resolution, aggregation_method)
+
+
+class DatasetHandle:
+    """Points at the store callbacks should read from. A reload builds a whole
+    new store and swaps the reference in one assignment, so a callback that
+    grabs `current()` once keeps a consistent version for its whole run."""
+
+    def __init__(self, store):
+        self._store = store
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def current(self):
+        return self._store
+
+    @property
+    def version(self):
+        return self._store.version
+
+    def subscribe(self, listener):
+        """`listener(store)` runs after every swap, e.g. to invalidate caches
+        that depend on the dataset version."""
+        self._listeners.append(listener)
+        listener(self._store)
+
+    def swap(self, store):
+        with self._lock:
+            self._store = store
+            for listener in self._listeners:
+                listener(store)
@@ -1,10 +1,18 @@
 import pandas as pd
+from utils.aggregation import AggregationCube
+from utils.dataset import mode_values
+from utils.store import RidershipStore
 
 
 def get_df(data, min_date, max_date, modes, resolution, aggregation_method):
     #print(min_date, max_date)
+    if isinstance(data, RidershipStore):
+        return data.aggregate(min_date, max_date, modes, resolution, aggregation_method)
+    if isinstance(data, AggregationCube):
+        return data.query(min_date, max_date, modes, resolution, aggregation_method)
+
     resampler = (
-        data.set_index('date')[modes]
+        pd.DataFrame({mode: mode_values(data, mode) for mode in modes}, index=pd.DatetimeIndex(data['date']))
             .loc[min_date:max_date]
             .resample(resolution)
     )
@@ -12,6 +20,5 @@ def get_df(data, min_date, max_date, modes, resolution, aggregation_method):
         df = resampler.mean().reset_index()
     elif aggregation_method == "sum":
         df = resampler.sum().reset_index()
-    
-    return df
 
+    return df
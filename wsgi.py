@@ -0,0 +1,6 @@
+from app import create_app
+
+# the dataset is loaded here, i.e. once in the gunicorn master when the app
+# is preloaded (see gunicorn.conf.py); forked workers share its pages
+app = create_app(watch=False, warm=False)
+server = app.server